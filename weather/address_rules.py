@@ -0,0 +1,100 @@
+import re
+import threading
+from collections import Counter
+
+from .fuzzy_index import normalize
+from .models import Location
+
+# Postal code shapes that can't be mistaken for a place name.
+# An optional ",cc" country suffix is allowed, as OpenWeatherMap accepts it.
+ZIP_CODE_PATTERNS = [
+  re.compile(r'^\d{5}(-\d{4})?$'),                         # US
+  re.compile(r'^\d{3,6}$'),                                # most numeric systems (AT, CH, DE, FR, IN, ...)
+  re.compile(r'^[A-Z]{1,2}\d[A-Z\d]?\s*\d[A-Z]{2}$', re.I),  # UK
+  re.compile(r'^[A-Z]\d[A-Z]\s?\d[A-Z]\d$', re.I),          # Canada
+  re.compile(r'^\d{4}\s?[A-Z]{2}$', re.I),                  # Netherlands
+  re.compile(r'^\d{3}-\d{4}$'),                            # Japan
+]
+COUNTRY_SUFFIX = re.compile(r'\s*,\s*[A-Z]{2}$', re.I)
+
+_counts = Counter()
+_counts_lock = threading.Lock()
+
+
+def parse_gps_coordinates(location):
+  try:
+    coords = re.split(r'[,\s]+', location.strip())
+
+    if len(coords) == 2:
+      lat = float(coords[0])
+      lon = float(coords[1])
+
+      # Validate coordinate ranges
+      if -90 <= lat <= 90 and -180 <= lon <= 180:
+        return {'lat': lat, 'lon': lon}
+
+    return None
+
+  except (ValueError, IndexError):
+    return None
+
+
+def is_zip_code(location):
+  code = COUNTRY_SUFFIX.sub('', location.strip())
+  return any(pattern.match(code) for pattern in ZIP_CODE_PATTERNS)
+
+
+def known_location_type(location):
+  """
+  Classify input naming a stored Location that geocoding showed to be a city
+  or country, or a stored country name. Other stored names (landmarks saved
+  by create_query, districts, ...) are left to the classifier. Both lookups
+  are indexed equality matches.
+  """
+  address_type = (
+    Location.objects
+    .filter(name_key=normalize(location))
+    .exclude(address_type='')
+    .values_list('address_type', flat=True)
+    .first()
+  )
+  if address_type:
+    return address_type
+  if Location.objects.filter(country=location).exists():
+    return 'Country'
+  return None
+
+
+def _count(outcome):
+  with _counts_lock:
+    _counts[outcome] += 1
+
+
+def fast_classify(location):
+  """
+  Return the address type for input that cheap rules can decide
+  (GPS coordinates, postal codes, known places), or None if the
+  classifier has to be consulted.
+  """
+  location = location.strip()
+  if parse_gps_coordinates(location):
+    _count('gps')
+    return 'GPS Coordinates'
+  if is_zip_code(location):
+    _count('zip_code')
+    return 'Zip Code'
+  address_type = known_location_type(location)
+  if address_type:
+    _count('known_location')
+    return address_type
+  _count('classifier')
+  return None
+
+
+def fast_path_stats():
+  """Return how many inputs each rule decided and the fraction that skipped the classifier."""
+  with _counts_lock:
+    counts = dict(_counts)
+  total = sum(counts.values())
+  fast = total - counts.get('classifier', 0)
+  return {**counts, 'total': total, 'fast_path_ratio': fast / total if total else 0.0}
@@ -0,0 +1,156 @@
+import hashlib
+
+from django.db.models import Count, F, Max, Prefetch
+from django.db.models.functions import Abs
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date, quote_etag
+from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+
+from .models import Location, WeatherQuery, WeatherRecord
+from .serializers import LocationSerializer, WeatherQuerySerializer, WeatherRecordSerializer, requested_fields
+from .services import COMFORT_TEMP
+
+
+class ApiPagination(PageNumberPagination):
+  page_size = 50
+  page_size_query_param = 'page_size'
+  max_page_size = 500
+
+
+class ConditionalGetMixin:
+  """
+  Adds ETag / Last-Modified to list and detail responses and answers
+  If-None-Match / If-Modified-Since with 304 before anything is serialized.
+  Validators come from cheap aggregates (row count and latest updated_at)
+  over the rows the response would contain; see validator_aggregates().
+  """
+  lookup_value_regex = r'[0-9]+'
+
+  def validator_aggregates(self, queryset):
+    """Return (count, last modified datetime or None) pairs describing queryset."""
+    agg = queryset.aggregate(n=Count('pk'), modified=Max('updated_at'))
+    return [(agg['n'], agg['modified'])]
+
+  def validators(self, queryset):
+    parts = [self.request.get_full_path()]
+    last_modified = None
+    for count, modified in self.validator_aggregates(queryset):
+      parts.append(f'{count}:{modified.isoformat() if modified else ""}')
+      if modified and (last_modified is None or modified > last_modified):
+        last_modified = modified
+    etag = hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+    return quote_etag(etag), last_modified
+
+  def conditional(self, queryset, respond):
+    etag, last_modified = self.validators(queryset)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(self.request._request, etag=etag, last_modified=timestamp)
+    if response is None:
+      response = respond()
+    if response.status_code in (200, 304):
+      response['ETag'] = etag
+      if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    return response
+
+  def list(self, request, *args, **kwargs):
+    queryset = self.filter_queryset(self.get_queryset())
+    return self.conditional(queryset, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs))
+
+  def retrieve(self, request, *args, **kwargs):
+    queryset = self.get_queryset().filter(pk=kwargs[self.lookup_field])
+    return self.conditional(queryset, lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs))
+
+
+def _date_param(request, name):
+  value = request.query_params.get(name)
+  if not value:
+    return None
+  try:
+    parsed = parse_date(value)
+  except ValueError:
+    parsed = None
+  if parsed is None:
+    raise ValidationError({name: 'Expected YYYY-MM-DD.'})
+  return parsed
+
+
+class LocationViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+  serializer_class = LocationSerializer
+  pagination_class = ApiPagination
+  queryset = Location.objects.order_by('pk')
+
+
+class WeatherRecordViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+  """Filters: ?location=<id>&query=<id>&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD"""
+  serializer_class = WeatherRecordSerializer
+  pagination_class = ApiPagination
+
+  def get_queryset(self):
+    return WeatherRecord.objects.order_by('location_id', 'date')
+
+  def filter_queryset(self, queryset):
+    params = self.request.query_params
+    if params.get('location', '').isdigit():
+      queryset = queryset.filter(location_id=params['location'])
+    if params.get('query', '').isdigit():
+      queryset = queryset.filter(source_query_id=params['query'])
+    start_date = _date_param(self.request, 'start_date')
+    end_date = _date_param(self.request, 'end_date')
+    if start_date:
+      queryset = queryset.filter(date__gte=start_date)
+    if end_date:
+      queryset = queryset.filter(date__lte=end_date)
+    return queryset
+
+
+class WeatherQueryViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+  """
+  Filters: ?location=<id>&max_comfort_gap=<°C> (best_temp within that many
+  degrees of COMFORT_TEMP); ?ordering=comfort puts the most temperate first.
+  Each query embeds its location; add 'records' or 'raw_response' to ?fields=
+  to also get its daily records or the upstream JSON.
+  """
+  serializer_class = WeatherQuerySerializer
+  pagination_class = ApiPagination
+
+  def wants(self, field):
+    return field in (requested_fields(self.request) or ())
+
+  def get_queryset(self):
+    queryset = WeatherQuery.objects.select_related('location').order_by('-created_at', '-pk')
+    if self.wants('raw_response'):
+      queryset = queryset.select_related('raw_payload')
+    if self.wants('records'):
+      queryset = queryset.prefetch_related(
+        Prefetch('weatherrecord_set', queryset=WeatherRecord.objects.order_by('date'))
+      )
+    return queryset
+
+  def filter_queryset(self, queryset):
+    params = self.request.query_params
+    if params.get('location', '').isdigit():
+      queryset = queryset.filter(location_id=params['location'])
+    if params.get('max_comfort_gap'):
+      try:
+        gap = float(params['max_comfort_gap'])
+      except ValueError:
+        raise ValidationError({'max_comfort_gap': 'Expected a number.'})
+      queryset = queryset.filter(best_temp__range=(COMFORT_TEMP - gap, COMFORT_TEMP + gap))
+    if params.get('ordering') == 'comfort':
+      queryset = queryset.order_by(
+        Abs(F('best_temp') - COMFORT_TEMP).asc(nulls_last=True), '-created_at', '-pk'
+      )
+    return queryset
+
+  def validator_aggregates(self, queryset):
+    agg = queryset.aggregate(n=Count('pk'), modified=Max('updated_at'), location_modified=Max('location__updated_at'))
+    pairs = [(agg['n'], agg['modified']), (agg['n'], agg['location_modified'])]
+    if self.wants('records'):
+      records = WeatherRecord.objects.filter(source_query__in=queryset.values('pk'))
+      rec = records.aggregate(n=Count('pk'), modified=Max('updated_at'))
+      pairs.append((rec['n'], rec['modified']))
+    return pairs
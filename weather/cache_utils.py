@@ -0,0 +1,241 @@
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+
+from .singleflight import SingleFlight, cache_lock
+
+
+class LRUCache:
+  """
+  Bounded, thread-safe in-process cache.
+  Mirrors the get/set/delete part of Django's cache API so it can stand in
+  for a cache backend.
+  """
+
+  def __init__(self, maxsize=1024):
+    self.maxsize = maxsize
+    self._data = OrderedDict()  # key -> (expires_at or None, value)
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def get(self, key, default=None):
+    with self._lock:
+      item = self._data.get(key)
+      if item is None:
+        self.misses += 1
+        return default
+      expires_at, value = item
+      if expires_at is not None and expires_at <= time.monotonic():
+        del self._data[key]
+        self.misses += 1
+        return default
+      self._data.move_to_end(key)
+      self.hits += 1
+      return value
+
+  def set(self, key, value, timeout=None):
+    expires_at = time.monotonic() + timeout if timeout is not None else None
+    with self._lock:
+      self._data[key] = (expires_at, value)
+      self._data.move_to_end(key)
+      while len(self._data) > self.maxsize:
+        self._data.popitem(last=False)
+        self.evictions += 1
+
+  def delete(self, key):
+    with self._lock:
+      self._data.pop(key, None)
+
+  def clear(self):
+    with self._lock:
+      self._data.clear()
+
+  def stats(self):
+    with self._lock:
+      return {
+        'size': len(self._data),
+        'maxsize': self.maxsize,
+        'hits': self.hits,
+        'misses': self.misses,
+        'evictions': self.evictions,
+      }
+
+  def __len__(self):
+    return len(self._data)
+
+
+""" OpenWeatherMap response cache """
+DEFAULT_RESPONSE_TTLS = {'current': 600, 'forecast': 1800}  # seconds
+DEFAULT_STALE_TTL = 300  # extra seconds a stale entry may be served while it refreshes
+COORD_PRECISION = 2  # ~1 km, close enough to share a forecast
+
+_local_cache = LRUCache(maxsize=2048)
+_stats = Counter()
+_stats_lock = threading.Lock()
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+_flights = SingleFlight()
+
+
+def _backend():
+  alias = getattr(settings, 'WEATHER_CACHE_ALIAS', 'default')
+  if alias is None:
+    return _local_cache
+  try:
+    return caches[alias]
+  except InvalidCacheBackendError:
+    return _local_cache
+
+
+def _cache_get(key):
+  try:
+    return _backend().get(key)
+  except Exception:
+    # shared cache unreachable: keep serving from this process
+    return _local_cache.get(key)
+
+
+def _cache_set(key, value, timeout):
+  try:
+    _backend().set(key, value, timeout)
+  except Exception:
+    _local_cache.set(key, value, timeout)
+
+
+def _count(kind, event):
+  with _stats_lock:
+    _stats[(kind, event)] += 1
+
+
+def response_ttl(kind):
+  ttls = {**DEFAULT_RESPONSE_TTLS, **getattr(settings, 'WEATHER_CACHE_TTL', {})}
+  return ttls[kind]
+
+
+def response_cache_key(kind, params):
+  """Build a cache key from the parts of params that change the answer (never the API key)."""
+  parts = [kind, str(params.get('units', 'metric'))]
+  if params.get('lat') is not None and params.get('lon') is not None:
+    parts.append('ll:%.*f,%.*f' % (COORD_PRECISION, float(params['lat']), COORD_PRECISION, float(params['lon'])))
+  elif params.get('zip'):
+    parts.append('zip:' + ''.join(str(params['zip']).lower().split()))
+  else:
+    parts.append('q:' + ' '.join(str(params.get('q', '')).lower().split()))
+  return 'owm:' + ':'.join(parts)
+
+
+def _store(kind, key, data):
+  ttl = response_ttl(kind)
+  stale_ttl = getattr(settings, 'WEATHER_CACHE_STALE_TTL', DEFAULT_STALE_TTL)
+  _cache_set(key, {'data': data, 'fresh_until': time.time() + ttl}, ttl + stale_ttl)
+
+
+def _refresh_in_background(kind, key, loader):
+  with _refreshing_lock:
+    if key in _refreshing:
+      return
+    _refreshing.add(key)
+
+  def run():
+    try:
+      _store(kind, key, loader())
+      _count(kind, 'refreshes')
+    except Exception:
+      _count(kind, 'refresh_errors')
+    finally:
+      with _refreshing_lock:
+        _refreshing.discard(key)
+
+  threading.Thread(target=run, daemon=True).start()
+
+
+def cached_response(kind, params, loader):
+  """
+  Return loader()'s JSON for these params, served from cache when possible.
+  Fresh entries are returned as-is; stale entries are returned immediately
+  while a background thread refreshes them. On a miss, concurrent callers
+  for the same key wait for a single loader() call. Errors are not cached.
+  """
+  key = response_cache_key(kind, params)
+  entry = _cache_get(key)
+  if entry is not None:
+    if entry['fresh_until'] > time.time():
+      _count(kind, 'hits')
+    else:
+      _count(kind, 'stale_hits')
+      _refresh_in_background(kind, key, loader)
+    return entry['data']
+
+  # concurrent misses for the same key share one upstream call
+  return _flights.do(key, _load_and_store, kind, key, loader)
+
+
+def _load_and_store(kind, key, loader):
+  with cache_lock(key):
+    # another process may have filled the entry while we waited for the lock
+    entry = _cache_get(key)
+    if entry is not None and entry['fresh_until'] > time.time():
+      _count(kind, 'hits')
+      return entry['data']
+    _count(kind, 'misses')
+    data = loader()
+    _store(kind, key, data)
+    return data
+
+
+def response_cache_stats():
+  """Return hit/miss counters per response kind, e.g. {'forecast': {'hits': 3, 'misses': 1}}."""
+  with _stats_lock:
+    stats = {}
+    for (kind, event), n in _stats.items():
+      stats.setdefault(kind, {})[event] = n
+  return stats
+
+
+""" Home page cache """
+HOME_VERSION_KEY = 'home:version'
+DEFAULT_HOME_TTL = 300
+
+
+def home_cache_ttl():
+  return getattr(settings, 'HOME_CACHE_TTL', DEFAULT_HOME_TTL)
+
+
+def home_version():
+  version = _cache_get(HOME_VERSION_KEY)
+  return version if version is not None else bump_home_version()
+
+
+def bump_home_version():
+  """Invalidate every cached home page: entries under the old version are never looked up again."""
+  version = uuid.uuid4().hex
+  _cache_set(HOME_VERSION_KEY, version, None)
+  return version
+
+
+def _cached_home(name, compute):
+  key = f'home:{home_version()}:{name}'
+  value = _cache_get(key)
+  if value is not None:
+    _count('home', 'hits')
+    return value
+  _count('home', 'misses')
+  value = compute()
+  _cache_set(key, value, home_cache_ttl())
+  return value
+
+
+def cached_home_page(page, render):
+  """Return the cached HTML of this home page, or render() and cache it."""
+  return _cached_home(f'page:{page}', render)
+
+
+def cached_home_count(count):
+  """Return the cached number of saved queries, or count() and cache it."""
+  return _cached_home('count', count)
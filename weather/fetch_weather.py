@@ -1,10 +1,25 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
 from django.conf import settings
+from . import http_client
+from .cache_utils import cached_response
 
 OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+OPEN_METEO_ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+ARCHIVE_LAG_DAYS = 5 # the archive trails today by a few days; newer days come from the forecast API
+HISTORY_CHUNK_DAYS = 366 # days per Open-Meteo request
+OPENWEATHER_CURRENT_URL = "https://api.openweathermap.org/data/2.5/weather"
 OPENWEATHER_FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"
+OPENWEATHER_URLS = {
+  'current': OPENWEATHER_CURRENT_URL,
+  'forecast': OPENWEATHER_FORECAST_URL,
+}
 
-def fetch_weather_for_range(lat, lon, start_date, end_date):
+# Shared by all requests so concurrent upstream calls don't spawn threads per request
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='openweather')
+_history_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='open-meteo')
+
+def fetch_weather_for_range(lat, lon, start_date, end_date, url=OPEN_METEO_URL):
   params = {
     "latitude": lat,
     "longitude": lon,
@@ -13,10 +28,48 @@ def fetch_weather_for_range(lat, lon, start_date, end_date):
     "daily": "temperature_2m_min,temperature_2m_max,weathercode",
     "timezone": "UTC"
   }
-  r = requests.get(OPEN_METEO_URL, params=params, timeout=15)
+  r = http_client.get('open_meteo', url, params=params)
   r.raise_for_status()
   return r.json()
 
+def history_chunks(ranges, today=None):
+  """
+  Split (start, end) date ranges into (url, start, end) requests of at most
+  HISTORY_CHUNK_DAYS, using the archive API for days it already has.
+  """
+  today = today or date.today()
+  archive_end = today - timedelta(days=ARCHIVE_LAG_DAYS + 1)
+  chunks = []
+  for start, end in ranges:
+    while start <= end:
+      url = OPEN_METEO_ARCHIVE_URL if start <= archive_end else OPEN_METEO_URL
+      stop = min(end, start + timedelta(days=HISTORY_CHUNK_DAYS - 1))
+      if url == OPEN_METEO_ARCHIVE_URL:
+        stop = min(stop, archive_end)
+      chunks.append((url, start, stop))
+      start = stop + timedelta(days=1)
+  return chunks
+
+def fetch_daily_history(lat, lon, ranges):
+  """
+  Fetch Open-Meteo daily values for the given past (start, end) date ranges,
+  one request per chunk, in parallel.
+  Returns parse_api_daily() days sorted by date, each with an 'observed' flag
+  (True for archive data, False for the forecast API's recent past).
+  """
+  chunks = history_chunks(ranges)
+  futures = [
+    (url, _history_executor.submit(fetch_weather_for_range, lat, lon, start, end, url))
+    for url, start, end in chunks
+  ]
+  days = []
+  for url, future in futures:
+    for day in parse_api_daily(future.result()):
+      day['observed'] = url == OPEN_METEO_ARCHIVE_URL
+      days.append(day)
+  days.sort(key=lambda d: d['date'])
+  return days
+
 def fetch_openweather_forecast(lat, lon):
   """
   Fetch the 5-day / 3-hour forecast from OpenWeatherMap.
@@ -32,9 +85,38 @@ def fetch_openweather_forecast(lat, lon):
     "appid": api_key,
     "units": "metric"
   }
-  r = requests.get(OPENWEATHER_FORECAST_URL, params=params, timeout=15)
-  r.raise_for_status()
-  return r.json()
+  return fetch_openweather('forecast', params)
+
+def fetch_openweather(kind, params):
+  """
+  Fetch 'current' conditions or the 'forecast' from OpenWeatherMap for the given
+  query params, going through the response cache.
+  Raises requests.HTTPError on a non-2xx answer (errors are never cached).
+  """
+  def load():
+    r = http_client.get('openweather', OPENWEATHER_URLS[kind], params=params)
+    r.raise_for_status()
+    return r.json()
+
+  return cached_response(kind, params, load)
+
+def submit_openweather(kind, params):
+  """Run fetch_openweather on the shared thread pool and return its Future."""
+  return _executor.submit(fetch_openweather, kind, params)
+
+# WMO weather interpretation codes used by Open-Meteo
+WMO_DESCRIPTIONS = {
+  0: "clear sky", 1: "mainly clear", 2: "partly cloudy", 3: "overcast",
+  45: "fog", 48: "depositing rime fog",
+  51: "light drizzle", 53: "moderate drizzle", 55: "dense drizzle",
+  56: "light freezing drizzle", 57: "dense freezing drizzle",
+  61: "slight rain", 63: "moderate rain", 65: "heavy rain",
+  66: "light freezing rain", 67: "heavy freezing rain",
+  71: "slight snow fall", 73: "moderate snow fall", 75: "heavy snow fall", 77: "snow grains",
+  80: "slight rain showers", 81: "moderate rain showers", 82: "violent rain showers",
+  85: "slight snow showers", 86: "heavy snow showers",
+  95: "thunderstorm", 96: "thunderstorm with slight hail", 99: "thunderstorm with heavy hail",
+}
 
 def parse_api_daily(api_json):
   """Return list of { 'date': 'YYYY-MM-DD', 'temp_c': ..., 'description': ... }"""
@@ -51,7 +133,9 @@ def parse_api_daily(api_json):
     temp_c = None
     if minv is not None and maxv is not None:
       temp_c = round((minv + maxv) / 2.0, 1)
-    description = f"weathercode:{codes[i]}" if i < len(codes) else ""
+    description = ""
+    if i < len(codes) and codes[i] is not None:
+      description = WMO_DESCRIPTIONS.get(codes[i], f"weathercode:{codes[i]}")
     days.append({
       'date': d,
       'temp_c': temp_c,
@@ -0,0 +1,140 @@
+"""
+Daily aggregation of OpenWeatherMap 5-day / 3-hour forecasts.
+
+aggregate_forecast() returns the per-day summaries of one forecast JSON used by
+the views (without warnings). Slots are bucketed by calendar day in the city's
+own timezone (the forecast's city.timezone offset), not the server's, and
+reduced in one pass with running sums.
+"""
+import time
+from collections import Counter
+from datetime import date, datetime
+
+SECONDS_PER_DAY = 86400
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def utc_offset(forecast_json):
+  """Seconds east of UTC for the forecast's city (UTC if the API didn't say)."""
+  return int((forecast_json.get('city') or {}).get('timezone') or 0)
+
+
+def local_today(offset, now=None):
+  """Date ordinal of 'today' in a city offset seconds from UTC."""
+  now = time.time() if now is None else now
+  return EPOCH_ORDINAL + int(now + offset) // SECONDS_PER_DAY
+
+
+def _day_summary(date_key, day_name, temp_sum, temp_max, temp_min, humidity_sum,
+                 wind_sum_kmh, feels_sum, rain_sum, count, description, icon, visibility):
+  return {
+    'date': date_key,
+    'day_name': day_name,
+    'temperature': round(temp_sum / count, 1),
+    'max_temp': round(temp_max, 1),
+    'min_temp': round(temp_min, 1),
+    'feels_like': round(feels_sum / count, 1),
+    'description': description,
+    'icon': icon,
+    'humidity': round(humidity_sum / count),
+    'wind_speed': round(wind_sum_kmh / count, 1),
+    'rain_chance': round(rain_sum / count),
+    'visibility': visibility,
+    'warnings': None
+  }
+
+
+class _DayAccumulator:
+  __slots__ = ('count', 'temp_sum', 'temp_max', 'temp_min', 'humidity_sum', 'wind_sum_kmh',
+               'feels_sum', 'rain_sum', 'visibility', 'descriptions', 'icons')
+
+  def __init__(self, visibility):
+    self.count = 0
+    self.temp_sum = 0.0
+    self.temp_max = float('-inf')
+    self.temp_min = float('inf')
+    self.humidity_sum = 0.0
+    self.wind_sum_kmh = 0.0
+    self.feels_sum = 0.0
+    self.rain_sum = 0.0
+    self.visibility = visibility
+    self.descriptions = {}  # value -> count, in first-seen order
+    self.icons = {}
+
+
+def _mode(counts):
+  # max() keeps the first of equal counts, i.e. the value seen first
+  return max(counts, key=counts.get)
+
+
+def aggregate_forecast(forecast_json, today=None):
+  """Daily summaries of a forecast, skipping `today` (default: the current date in its city)."""
+  offset = utc_offset(forecast_json)
+  today_ordinal = today.toordinal() if today else local_today(offset)
+  daily = {}  # local date ordinal -> _DayAccumulator
+
+  for item in forecast_json.get('list', []):
+    ordinal = EPOCH_ORDINAL + (item['dt'] + offset) // SECONDS_PER_DAY
+    if ordinal == today_ordinal:
+      continue  # skip today
+
+    d = daily.get(ordinal)
+    if d is None:
+      d = daily[ordinal] = _DayAccumulator(item.get('visibility', 0) / 1000)
+
+    main = item['main']
+    temp = main['temp']
+    d.count += 1
+    d.temp_sum += temp
+    d.temp_max = max(d.temp_max, temp)
+    d.temp_min = min(d.temp_min, temp)
+    d.humidity_sum += main.get('humidity', 0)
+    d.wind_sum_kmh += item.get('wind', {}).get('speed', 0.0) * 3.6
+    d.feels_sum += main.get('feels_like', temp)
+    # 'pop' is probability of precipitation (0..1) in forecast API
+    d.rain_sum += item.get('pop', 0) * 100
+    weather = item['weather'][0]
+    desc = weather.get('description', '')
+    icon = weather.get('icon', '')
+    d.descriptions[desc] = d.descriptions.get(desc, 0) + 1
+    d.icons[icon] = d.icons.get(icon, 0) + 1
+
+  days = []
+  for ordinal in sorted(daily):
+    d = daily[ordinal]
+    day = date.fromordinal(ordinal)
+    days.append(_day_summary(
+      day.isoformat(), day.strftime('%A'), d.temp_sum, d.temp_max, d.temp_min, d.humidity_sum,
+      d.wind_sum_kmh, d.feels_sum, d.rain_sum, d.count,
+      _mode(d.descriptions), _mode(d.icons), d.visibility
+    ))
+  return days
+
+
+def reference_forecast(forecast_json, today):
+  """
+  The original views.process_forecast_data grouping restated plainly: per-day
+  lists, dates in the server's timezone, no warnings. aggregate_forecast()
+  matches it for a UTC city on a UTC server (tests, bench_forecast).
+  """
+  slots = {}
+  for item in forecast_json.get('list', []):
+    dt = datetime.fromtimestamp(item['dt'])
+    if dt.date() != today:
+      slots.setdefault(dt.date(), []).append(item)
+
+  days = []
+  for day in sorted(slots):
+    items = slots[day]
+    temps = [i['main']['temp'] for i in items]
+    days.append(_day_summary(
+      day.isoformat(), day.strftime('%A'), sum(temps), max(temps), min(temps),
+      sum(i['main'].get('humidity', 0) for i in items),
+      sum(i.get('wind', {}).get('speed', 0.0) * 3.6 for i in items),
+      sum(i['main'].get('feels_like', i['main']['temp']) for i in items),
+      sum(i.get('pop', 0) * 100 for i in items), len(items),
+      Counter(i['weather'][0].get('description', '') for i in items).most_common(1)[0][0],
+      Counter(i['weather'][0].get('icon', '') for i in items).most_common(1)[0][0],
+      items[0].get('visibility', 0) / 1000
+    ))
+  return days
@@ -0,0 +1,119 @@
+import threading
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+MAX_CANDIDATES = 64  # names sharing the most trigrams that get a full difflib comparison
+
+
+def normalize(name):
+  return ' '.join(name.lower().split())
+
+
+def trigrams(text):
+  padded = f'  {text} '
+  return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+  """
+  Inverted trigram index over place names.
+  search() returns the same kind of answer as difflib.get_close_matches(query, names, n=1),
+  but only scores the few names that share the most trigrams with the query
+  instead of the whole table.
+  """
+
+  def __init__(self):
+    self._postings = defaultdict(list)  # trigram -> [name id]
+    self._names = []  # name id -> original name
+    self._normalized = []  # name id -> normalized name
+    self._ids = {}  # live name -> name id
+    self._dead = set()  # ids of discarded names; their postings are skipped
+
+  def __len__(self):
+    return len(self._ids)
+
+  def add(self, name):
+    if name in self._ids:
+      return
+    name_id = self._ids[name] = len(self._names)
+    key = normalize(name)
+    self._names.append(name)
+    self._normalized.append(key)
+    for gram in trigrams(key):
+      self._postings[gram].append(name_id)
+
+  def discard(self, name):
+    name_id = self._ids.pop(name, None)
+    if name_id is not None:
+      self._dead.add(name_id)
+
+  def search(self, query, cutoff=0.75, max_candidates=MAX_CANDIDATES):
+    key = normalize(query)
+    if not key:
+      return None
+
+    # ratio = 2*M/(len(a)+len(b)) >= cutoff bounds how different the lengths can be
+    min_len = len(key) * cutoff / (2 - cutoff)
+    max_len = len(key) * (2 - cutoff) / cutoff
+
+    overlap = Counter()
+    for gram in trigrams(key):
+      overlap.update(self._postings.get(gram, ()))
+    for name_id in self._dead.intersection(overlap):
+      del overlap[name_id]
+
+    matcher = SequenceMatcher()
+    matcher.set_seq2(key)
+    best = None
+    for name_id, _ in overlap.most_common(max_candidates):
+      candidate = self._normalized[name_id]
+      if not min_len <= len(candidate) <= max_len:
+        continue
+      matcher.set_seq1(candidate)
+      if matcher.real_quick_ratio() < cutoff or matcher.quick_ratio() < cutoff:
+        continue
+      score = matcher.ratio()
+      if score >= cutoff and (best is None or (score, candidate) > best[:2]):
+        best = (score, candidate, self._names[name_id])
+    return best[2] if best else None
+
+
+class LocationNameIndex:
+  """
+  Process-wide TrigramIndex over Location.name.
+  Built on first use, then topped up with rows inserted since (by any process)
+  before every search, so it never needs a full rebuild. It lives in memory,
+  so each process pays one full-table load on its first search. A match is
+  checked against the table before it is returned; names whose rows have been
+  deleted are dropped and the search repeated.
+  """
+
+  def __init__(self):
+    self._index = TrigramIndex()
+    self._last_id = 0
+    self._lock = threading.Lock()
+
+  def _catch_up(self):
+    from .models import Location
+    rows = Location.objects.filter(pk__gt=self._last_id).order_by('pk').values_list('pk', 'name')
+    for pk, name in rows.iterator(chunk_size=10000):
+      self._index.add(name)
+      self._last_id = pk
+
+  def search(self, query, cutoff=0.75):
+    from .models import Location
+    with self._lock:
+      self._catch_up()
+      while True:
+        match = self._index.search(query, cutoff=cutoff)
+        if match is None or Location.objects.filter(name=match).exists():
+          return match
+        self._index.discard(match)
+
+  def reset(self):
+    with self._lock:
+      self._index = TrigramIndex()
+      self._last_id = 0
+
+
+location_names = LocationNameIndex()
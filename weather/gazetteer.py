@@ -0,0 +1,244 @@
+"""
+Offline geocoding from a GeoNames gazetteer.
+
+build_gazetteer() turns the GeoNames dumps (https://download.geonames.org/export/dump/)
+into one indexed SQLite file:
+  - cities: allCountries.txt / cities500.txt / cities15000.txt (19 tab-separated columns)
+  - postcodes: the postal code dump's allCountries.txt (12 columns), optional
+  - countries: countryInfo.txt, optional; lets country names resolve to their capital
+
+Gazetteer opens that file read-only and memory-mapped, one connection per
+thread (reopened after a rebuild replaces the file), and resolves place
+names, postcodes and country names without any network call.
+geocoder.geocode() consults it first when settings.GAZETTEER_PATH is set and
+only asks Nominatim on a miss.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+from .address_rules import COUNTRY_SUFFIX, is_zip_code
+from .fuzzy_index import normalize
+
+INSERT_BATCH = 10000
+MMAP_BYTES = 1 << 30  # map up to 1 GiB of the file instead of reading pages into SQLite's cache
+
+SCHEMA = """
+CREATE TABLE places (name_key TEXT NOT NULL, name TEXT NOT NULL, country TEXT NOT NULL,
+                     lat REAL NOT NULL, lon REAL NOT NULL, population INTEGER NOT NULL);
+CREATE TABLE postcodes (code_key TEXT NOT NULL, country TEXT NOT NULL, place TEXT NOT NULL,
+                        lat REAL NOT NULL, lon REAL NOT NULL);
+CREATE TABLE countries (name_key TEXT NOT NULL, code TEXT NOT NULL, name TEXT NOT NULL, capital TEXT NOT NULL);
+"""
+INDEXES = """
+CREATE INDEX places_name ON places (name_key, population DESC);
+CREATE INDEX places_country ON places (country, population DESC);
+CREATE INDEX postcodes_code ON postcodes (code_key, country);
+CREATE INDEX countries_name ON countries (name_key);
+"""
+
+
+def postcode_key(code):
+  return ''.join(code.upper().split())
+
+
+def _read_tsv(path):
+  with open(path, encoding='utf-8') as f:
+    for line in f:
+      if line.startswith('#') or not line.strip():
+        continue
+      yield line.rstrip('\n').split('\t')
+
+
+def _city_rows(path, min_population, alternate_names):
+  for cols in _read_tsv(path):
+    if len(cols) < 15 or cols[6] != 'P':  # populated places only
+      continue
+    population = int(cols[14] or 0)
+    if population < min_population:
+      continue
+    names = {cols[1], cols[2]}
+    if alternate_names and cols[3]:
+      names.update(n for n in cols[3].split(',') if n)
+    lat, lon, country = float(cols[4]), float(cols[5]), cols[8]
+    for key in {normalize(n) for n in names if n}:
+      yield (key, cols[1], country, lat, lon, population)
+
+
+def _postcode_rows(path):
+  for cols in _read_tsv(path):
+    if len(cols) < 11 or not cols[9] or not cols[10]:
+      continue
+    yield (postcode_key(cols[1]), cols[0], cols[2], float(cols[9]), float(cols[10]))
+
+
+def _country_rows(path):
+  for cols in _read_tsv(path):
+    if len(cols) < 6:
+      continue
+    yield (normalize(cols[4]), cols[0], cols[4], cols[5])
+
+
+def _insert(conn, table, rows):
+  placeholders = ','.join('?' * len(conn.execute(f'SELECT * FROM {table} LIMIT 0').description))
+  sql = f'INSERT INTO {table} VALUES ({placeholders})'
+  batch, total = [], 0
+  for row in rows:
+    batch.append(row)
+    if len(batch) >= INSERT_BATCH:
+      conn.executemany(sql, batch)
+      total += len(batch)
+      batch = []
+  conn.executemany(sql, batch)
+  return total + len(batch)
+
+
+def build_gazetteer(output, cities, postcodes=None, countries=None, min_population=0, alternate_names=False):
+  """
+  Build the gazetteer SQLite file at `output` from GeoNames dumps, streaming
+  them row by row. The file is written next to `output` and swapped in when
+  complete, so running lookups never see a half-built index.
+  Returns the number of rows loaded per table.
+  """
+  tmp = f'{output}.building'
+  if os.path.exists(tmp):
+    os.remove(tmp)
+  conn = sqlite3.connect(tmp)
+  try:
+    try:
+      conn.executescript('PRAGMA journal_mode=OFF; PRAGMA synchronous=OFF;' + SCHEMA)
+      counts = {'places': _insert(conn, 'places', _city_rows(cities, min_population, alternate_names))}
+      if postcodes:
+        counts['postcodes'] = _insert(conn, 'postcodes', _postcode_rows(postcodes))
+      if countries:
+        counts['countries'] = _insert(conn, 'countries', _country_rows(countries))
+      conn.executescript(INDEXES)  # indexing after the load is much faster than during it
+      conn.commit()
+      conn.execute('ANALYZE')
+    finally:
+      conn.close()
+    os.replace(tmp, output)
+  except BaseException:
+    if os.path.exists(tmp):
+      os.remove(tmp)
+    raise
+  return counts
+
+
+class Gazetteer:
+  """Read-only lookups against a file made by build_gazetteer()."""
+  recheck_interval = 1.0  # seconds between checks for a rebuilt file
+
+  def __init__(self, path):
+    self.path = str(path)
+    self._local = threading.local()
+    self._country_names = {}  # file identity -> {code: name}
+
+  def _identity(self):
+    # changes when build_gazetteer() swaps a new file in
+    stat = os.stat(self.path)
+    return stat.st_ino, stat.st_mtime_ns
+
+  def _conn(self):
+    conn = getattr(self._local, 'conn', None)
+    now = time.monotonic()
+    if conn is not None and now - self._local.checked_at < self.recheck_interval:
+      return conn
+    identity = self._identity()
+    if conn is None or self._local.identity != identity:
+      if conn is not None:
+        conn.close()  # a rebuild swapped the file in; the old one is unlinked
+      conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+      conn.execute(f'PRAGMA mmap_size={MMAP_BYTES}')
+      self._local.conn, self._local.identity = conn, identity
+    self._local.checked_at = now
+    return conn
+
+  def country_name(self, code):
+    conn = self._conn()
+    names = self._country_names.get(self._local.identity)
+    if names is None:
+      names = dict(conn.execute('SELECT code, name FROM countries'))
+      self._country_names = {self._local.identity: names}
+    return names.get(code, code)
+
+  def _place(self, name, country, lat, lon):
+    country_name = self.country_name(country)
+    return {
+      'lat': lat,
+      'lon': lon,
+      'display_name': f'{name}, {country_name}',
+      'country': country_name,
+      'city': name,
+    }
+
+  def postcode(self, text):
+    code = COUNTRY_SUFFIX.sub('', text.strip())
+    suffix = text.strip()[len(code):].strip(' ,').upper()
+    sql = 'SELECT place, country, lat, lon FROM postcodes WHERE code_key = ?'
+    args = [postcode_key(code)]
+    if suffix:
+      sql += ' AND country = ?'
+      args.append(suffix)
+    row = self._conn().execute(sql + ' LIMIT 1', args).fetchone()
+    return self._place(*row) if row else None
+
+  def country(self, text):
+    conn = self._conn()
+    row = conn.execute('SELECT code, name, capital FROM countries WHERE name_key = ?', (normalize(text),)).fetchone()
+    if row is None:
+      return None
+    code, name, capital = row
+    # the capital if it's in the file, else the country's most populous place
+    place = conn.execute(
+      'SELECT lat, lon FROM places WHERE name_key = ? AND country = ? ORDER BY population DESC LIMIT 1',
+      (normalize(capital), code)
+    ).fetchone() or conn.execute(
+      'SELECT lat, lon FROM places WHERE country = ? ORDER BY population DESC LIMIT 1', (code,)
+    ).fetchone()
+    if place is None:
+      return None
+    return {'lat': place[0], 'lon': place[1], 'display_name': name, 'country': name, 'city': capital}
+
+  def place(self, text):
+    """Most populous place with this name; 'Name, CC' restricts it to a country code."""
+    name, country = text, None
+    if ',' in text:
+      head, tail = text.rsplit(',', 1)
+      if len(tail.strip()) == 2:
+        name, country = head, tail.strip().upper()
+    sql = 'SELECT name, country, lat, lon FROM places WHERE name_key = ?'
+    args = [normalize(name)]
+    if country:
+      sql += ' AND country = ?'
+      args.append(country)
+    row = self._conn().execute(sql + ' ORDER BY population DESC LIMIT 1', args).fetchone()
+    return self._place(*row) if row else None
+
+  def lookup(self, text):
+    """Resolve a postcode, country or place name; same result shape as geocoder.geocode(), or None."""
+    text = text.strip()
+    if not text:
+      return None
+    if is_zip_code(text):
+      return self.postcode(text)
+    return self.country(text) or self.place(text)
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+  """The Gazetteer at settings.GAZETTEER_PATH, or None when offline geocoding is off or not built."""
+  global _gazetteer
+  path = getattr(settings, 'GAZETTEER_PATH', None)
+  if not path or not os.path.exists(path):
+    return None
+  with _gazetteer_lock:
+    if _gazetteer is None or _gazetteer.path != str(path):
+      _gazetteer = Gazetteer(path)
+    return _gazetteer
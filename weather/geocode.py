@@ -1,49 +1,50 @@
-import requests
+from .fuzzy_index import location_names, normalize
+from .geocoder import geocode
 from .models import Location
-from difflib import get_close_matches
+from .singleflight import cache_lock, single_flight
 
-NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
-USER_AGENT = "WeatherApp/1.0"
+def place_type(key, place):
+  """'Country' or 'City' when the geocoded place shows the query names one, else ''."""
+  if key == normalize(place['country']):
+    return 'Country'
+  if key == normalize(place['city'] or ''):
+    return 'City'
+  return ''
 
+@single_flight(lambda query: normalize(query))
 def get_or_create_location(query: str):
   query = query.strip()
-  # 1) exact case-insensitive match
-  qs = Location.objects.filter(name__iexact=query)
-  if qs.exists():
-    return qs.first()
+  key = normalize(query)
+  # 1) exact match on the normalized name (indexed)
+  loc = Location.objects.filter(name_key=key).first()
+  if loc:
+    return loc
 
-  # 2) fuzzy match against stored Location names
-  all_names = list(Location.objects.values_list('name', flat=True))
-  if all_names:
-    matches = get_close_matches(query, all_names, n=1, cutoff=0.75)
-    if matches:
-      return Location.objects.get(name=matches[0])
+  # 2) fuzzy match against stored Location names (trigram index, see fuzzy_index.py)
+  match = location_names.search(query, cutoff=0.75)
+  if match:
+    loc = Location.objects.filter(name=match).first()
+    if loc:
+      return loc
 
-  # 3) query Nominatim
-  params = {
-    'q': query,
-    'format': 'json',
-    'limit': 1,
-    'addressdetails': 1,
-  }
-  headers = {'User-Agent': USER_AGENT}
-  resp = requests.get(NOMINATIM_URL, params=params, headers=headers, timeout=10)
-  if resp.status_code != 200 or not resp.json():
-    raise ValueError("Location not found; try a different query or spelling.")
+  # 3) geocode (persistent cache, then rate-limited Nominatim) and store the result;
+  # the lock keeps another process from creating the same Location concurrently
+  with cache_lock('location:' + key):
+    loc = Location.objects.filter(name_key=key).first()
+    if loc:
+      return loc
 
-  data = resp.json()[0]
-  lat = float(data['lat'])
-  lon = float(data['lon'])
-  address = data.get('display_name', query)
-  address_comp = data.get('address', {})
-  country = address_comp.get('country', '')
+    place = geocode(query)
+    if place is None:
+      raise ValueError("Location not found; try a different query or spelling.")
 
-  # save to DB
-  loc = Location.objects.create(
-    name=query,
-    display_name=address,
-    latitude=lat,
-    longitude=lon,
-    country=country
-  )
-  return loc
+    # save to DB
+    loc = Location.objects.create(
+      name=query,
+      display_name=place['display_name'],
+      latitude=place['lat'],
+      longitude=place['lon'],
+      country=place['country'],
+      address_type=place_type(key, place)
+    )
+    return loc
@@ -0,0 +1,146 @@
+"""
+Nominatim geocoding behind a persistent cache.
+
+With settings.GAZETTEER_PATH set, geocode() first tries the offline GeoNames
+gazetteer (gazetteer.py). Otherwise, or on a gazetteer miss, it looks the
+normalized query up in the GeocodeResult table. Hits (including cached "not
+found" answers, which expire sooner) never reach Nominatim. Misses are
+coalesced per query, and the upstream calls from this process are queued
+through a token bucket so bursts wait their turn instead of breaking
+Nominatim's one-request-per-second policy.
+"""
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import http_client
+from .fuzzy_index import normalize
+from .gazetteer import get_gazetteer
+from .models import GeocodeResult
+from .ratelimit import RateLimiter
+from .singleflight import SingleFlight, cache_lock
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+DEFAULT_RATE = 1.0  # requests per second
+DEFAULT_TTL = 30 * 24 * 3600  # seconds a found place is trusted
+DEFAULT_NEGATIVE_TTL = 24 * 3600  # seconds a "not found" answer is trusted
+DEFAULT_QUEUE_TIMEOUT = 30  # seconds a caller may wait for its turn
+MAX_QUERY_LENGTH = 400  # GeocodeResult.query
+
+_limiter = None
+_limiter_lock = threading.Lock()
+_flights = SingleFlight()
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+class GeocoderBusy(Exception):
+  """The request queue is too long to get a Nominatim slot within the timeout."""
+
+
+def _count(event):
+  with _stats_lock:
+    _stats[event] += 1
+
+
+def limiter():
+  global _limiter
+  with _limiter_lock:
+    if _limiter is None:
+      _limiter = RateLimiter(getattr(settings, 'NOMINATIM_RATE', DEFAULT_RATE))
+    return _limiter
+
+
+def _as_dict(row):
+  if not row.found:
+    return None
+  return {
+    'lat': row.latitude,
+    'lon': row.longitude,
+    'display_name': row.display_name,
+    'country': row.country,
+    'city': row.city,
+  }
+
+
+def _cached(key):
+  return GeocodeResult.objects.filter(query=key, expires_at__gt=timezone.now()).first()
+
+
+def _fetch(query):
+  """Ask Nominatim, waiting for a rate-limit slot. Returns its first hit or None."""
+  if not limiter().acquire(timeout=getattr(settings, 'GEOCODER_QUEUE_TIMEOUT', DEFAULT_QUEUE_TIMEOUT)):
+    _count('busy')
+    raise GeocoderBusy("Geocoding service is busy; try again shortly.")
+  params = {
+    'q': query,
+    'format': 'json',
+    'limit': 1,
+    'addressdetails': 1,
+  }
+  resp = http_client.get('nominatim', NOMINATIM_URL, params=params)
+  resp.raise_for_status()  # upstream errors are never cached
+  results = resp.json()
+  return results[0] if results else None
+
+
+def _lookup(key, query):
+  with cache_lock('geocode:' + key):
+    # another process may have stored it while we waited for the lock
+    row = _cached(key)
+    if row is not None:
+      _count('hits' if row.found else 'negative_hits')
+      return _as_dict(row)
+
+    _count('misses')
+    hit = _fetch(query)
+    now = timezone.now()
+    if hit is None:
+      values = {'found': False, 'latitude': None, 'longitude': None, 'display_name': '', 'country': '', 'city': ''}
+      ttl = getattr(settings, 'GEOCODE_NEGATIVE_TTL', DEFAULT_NEGATIVE_TTL)
+    else:
+      address = hit.get('address', {})
+      values = {
+        'found': True,
+        'latitude': float(hit['lat']),
+        'longitude': float(hit['lon']),
+        'display_name': hit.get('display_name', query)[:400],
+        'country': address.get('country', '')[:100],
+        'city': (address.get('city') or address.get('town') or address.get('village') or address.get('state') or '')[:200],
+      }
+      ttl = getattr(settings, 'GEOCODE_CACHE_TTL', DEFAULT_TTL)
+    row, _ = GeocodeResult.objects.update_or_create(
+      query=key, defaults={**values, 'fetched_at': now, 'expires_at': now + timedelta(seconds=ttl)}
+    )
+    return _as_dict(row)
+
+
+def geocode(query):
+  """
+  Return {'lat', 'lon', 'display_name', 'country', 'city'} for a free-text
+  place, or None when neither the gazetteer nor Nominatim has a match.
+  Raises requests exceptions on upstream failures and GeocoderBusy when no
+  request slot frees up in time.
+  """
+  key = normalize(query)
+  if not key or len(key) > MAX_QUERY_LENGTH:
+    return None  # not a place name
+  offline = get_gazetteer()
+  if offline is not None:
+    place = offline.lookup(query)
+    if place is not None:
+      _count('gazetteer_hits')
+      return place
+  row = _cached(key)
+  if row is not None:
+    _count('hits' if row.found else 'negative_hits')
+    return _as_dict(row)
+  return _flights.do(key, _lookup, key, query)
+
+
+def geocode_stats():
+  with _stats_lock:
+    return dict(_stats)
@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import defaultdict
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Per-provider connection pool, timeout and retry policy.
+# Override any of these keys per provider with settings.UPSTREAM_HTTP.
+DEFAULT_PROVIDERS = {
+  'openweather': {'pool_size': 20, 'timeout': 10, 'retries': 2, 'backoff': 0.3},
+  'open_meteo': {'pool_size': 10, 'timeout': 15, 'retries': 2, 'backoff': 0.5},
+  # Nominatim's usage policy allows one request per second, so keep the pool small
+  'nominatim': {'pool_size': 2, 'timeout': 10, 'retries': 1, 'backoff': 1.0},
+}
+USER_AGENT = "WeatherApp/1.0"  # Nominatim requires a User-Agent
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_metrics = defaultdict(lambda: {
+  'requests': 0,
+  'errors': 0,
+  'total_seconds': 0.0,
+  'max_seconds': 0.0,
+  'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+})
+_metrics_lock = threading.Lock()
+
+
+def provider_config(provider):
+  overrides = getattr(settings, 'UPSTREAM_HTTP', {}).get(provider, {})
+  return {**DEFAULT_PROVIDERS[provider], **overrides}
+
+
+def provider_timeout(provider):
+  return provider_config(provider)['timeout']
+
+
+def _build_session(provider):
+  config = provider_config(provider)
+  retry = Retry(
+    total=config['retries'],
+    backoff_factor=config['backoff'],
+    # random extra delay so concurrent workers don't retry in lockstep
+    backoff_jitter=config['backoff'],
+    status_forcelist=RETRY_STATUSES,
+    allowed_methods=frozenset(['GET']),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+  )
+  adapter = HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=config['pool_size'],
+    pool_block=True,
+    max_retries=retry,
+  )
+  session = requests.Session()
+  session.headers['User-Agent'] = USER_AGENT
+  session.mount('https://', adapter)
+  session.mount('http://', adapter)
+  return session
+
+
+def get_session(provider):
+  """Return the keep-alive session shared by every call to this provider."""
+  session = _sessions.get(provider)
+  if session is None:
+    with _sessions_lock:
+      session = _sessions.get(provider)
+      if session is None:
+        session = _sessions[provider] = _build_session(provider)
+  return session
+
+
+def _record(provider, elapsed, error):
+  with _metrics_lock:
+    m = _metrics[provider]
+    m['requests'] += 1
+    m['errors'] += int(error)
+    m['total_seconds'] += elapsed
+    m['max_seconds'] = max(m['max_seconds'], elapsed)
+    for i, bound in enumerate(LATENCY_BUCKETS):
+      if elapsed <= bound:
+        m['buckets'][i] += 1
+        break
+    else:
+      m['buckets'][-1] += 1
+
+
+def get(provider, url, params=None, headers=None, timeout=None):
+  """
+  GET url through the provider's pooled session, with its timeout and retry policy.
+  Latency (including retries) is recorded per provider.
+  """
+  session = get_session(provider)
+  started = time.perf_counter()
+  try:
+    response = session.get(url, params=params, headers=headers, timeout=timeout or provider_timeout(provider))
+  except requests.RequestException:
+    _record(provider, time.perf_counter() - started, error=True)
+    raise
+  _record(provider, time.perf_counter() - started, error=response.status_code >= 400)
+  return response
+
+
+def latency_stats():
+  """Return per-provider request counts, error counts, mean/max latency and a latency histogram."""
+  with _metrics_lock:
+    stats = {}
+    for provider, m in _metrics.items():
+      labels = [f'<={b}s' for b in LATENCY_BUCKETS] + [f'>{LATENCY_BUCKETS[-1]}s']
+      stats[provider] = {
+        'requests': m['requests'],
+        'errors': m['errors'],
+        'mean_seconds': m['total_seconds'] / m['requests'] if m['requests'] else 0.0,
+        'max_seconds': m['max_seconds'],
+        'histogram': dict(zip(labels, m['buckets'])),
+      }
+  return stats
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from weather.models import WeatherQuery
+from weather.services import refresh_best_days
+from weather.signals import invalidate_home
+
+
+class Command(BaseCommand):
+  help = "Recompute the stored best day / temperature of every saved query from its records."
+
+  def add_arguments(self, parser):
+    parser.add_argument('--batch-size', type=int, default=500)
+
+  def handle(self, *args, **options):
+    ids = WeatherQuery.objects.order_by('pk').values_list('pk', flat=True)
+    batch, checked, updated = [], 0, 0
+    for pk in ids.iterator(chunk_size=options['batch_size']):
+      batch.append(pk)
+      if len(batch) >= options['batch_size']:
+        updated += refresh_best_days(batch, batch_size=options['batch_size'])
+        checked += len(batch)
+        batch = []
+    if batch:
+      updated += refresh_best_days(batch, batch_size=options['batch_size'])
+      checked += len(batch)
+    if updated:
+      invalidate_home()
+    self.stdout.write(self.style.SUCCESS(f"Checked {checked} queries; updated {updated}."))
@@ -0,0 +1,71 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from weather.ml_backends import BACKENDS, load_backend
+from weather.ml_utils import classifier_artifact_dir, id2label, model_path
+
+# Fixed sample of (address, expected label), covering every class
+SAMPLE = [
+  ('London', 'City'), ('Paris', 'City'), ('Tokyo', 'City'), ('New York', 'City'),
+  ('Cairo', 'City'), ('Sydney', 'City'), ('Amman', 'City'), ('Toronto', 'City'),
+  ('48.8566, 2.3522', 'GPS Coordinates'), ('40.7128 -74.0060', 'GPS Coordinates'),
+  ('-33.8688, 151.2093', 'GPS Coordinates'), ('31.95, 35.93', 'GPS Coordinates'),
+  ('Bibury', 'Town'), ('Hallstatt', 'Town'), ('Giethoorn', 'Town'), ('Zermatt', 'Town'),
+  ('70123', 'Zip Code'), ('10001', 'Zip Code'), ('SW1A 1AA', 'Zip Code'), ('75001', 'Zip Code'),
+  ('France', 'Country'), ('Jordan', 'Country'), ('Brazil', 'Country'), ('Japan', 'Country'),
+  ('Eiffel Tower', 'Landmarks'), ('Statue of Liberty', 'Landmarks'),
+  ('Great Wall of China', 'Landmarks'), ('Petra', 'Landmarks'),
+]
+
+
+class Command(BaseCommand):
+  help = "Compare accuracy and latency of the classifier backends against the fp32 model."
+
+  def add_arguments(self, parser):
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--repeat', type=int, default=5)
+
+  def measure(self, predict_ids, repeat):
+    addresses = [address for address, _ in SAMPLE]
+    predict_ids(addresses[:2])  # warm up
+
+    single = []
+    for _ in range(repeat):
+      for address in addresses:
+        started = time.perf_counter()
+        predict_ids([address])
+        single.append(time.perf_counter() - started)
+
+    batched = []
+    for _ in range(repeat):
+      started = time.perf_counter()
+      labels = [id2label[i] for i in predict_ids(addresses)]
+      batched.append(time.perf_counter() - started)
+    return labels, single, batched
+
+  def handle(self, *args, **options):
+    reference = None
+    backends = ['torch'] + [b for b in options['backends'] if b != 'torch']
+    for backend in backends:
+      started = time.perf_counter()
+      try:
+        predict_ids = load_backend(backend, model_path, classifier_artifact_dir())
+      except Exception as e:
+        self.stderr.write(f"{backend}: unavailable ({e})")
+        continue
+      load_time = time.perf_counter() - started
+
+      labels, single, batched = self.measure(predict_ids, options['repeat'])
+      if reference is None:
+        reference = labels
+      accuracy = sum(l == expected for l, (_, expected) in zip(labels, SAMPLE)) / len(SAMPLE)
+      agreement = sum(a == b for a, b in zip(labels, reference)) / len(SAMPLE)
+
+      self.stdout.write(
+        f"{backend:>9}: load {load_time:.2f}s | "
+        f"single p50 {statistics.median(single) * 1000:.1f}ms | "
+        f"batch of {len(SAMPLE)} p50 {statistics.median(batched) * 1000:.1f}ms | "
+        f"accuracy {accuracy:.0%} | agreement with fp32 {agreement:.0%}"
+      )
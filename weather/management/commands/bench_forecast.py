@@ -0,0 +1,48 @@
+import json
+import statistics
+import time
+import tracemalloc
+from datetime import date
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from weather.forecast_agg import aggregate_forecast, reference_forecast
+
+TESTDATA = Path(__file__).resolve().parents[2] / 'testdata'
+
+
+class Command(BaseCommand):
+  help = "Benchmark daily forecast aggregation against the reference grouping: time and peak memory per forecast."
+
+  def add_arguments(self, parser):
+    parser.add_argument('--forecasts', type=int, default=1000, help="Forecasts per batch.")
+    parser.add_argument('--repeat', type=int, default=5)
+
+  def handle(self, *args, **options):
+    recorded = [json.loads(p.read_text()) for p in sorted(TESTDATA.glob('forecast_*.json'))]
+    forecasts = [recorded[i % len(recorded)] for i in range(options['forecasts'])]
+    n = len(forecasts)
+    today = date.today()  # the recorded forecasts are in the past, so no slot is skipped
+
+    runs = {
+      'reference': lambda: [reference_forecast(f, today) for f in forecasts],
+      'aggregate_forecast': lambda: [aggregate_forecast(f, today) for f in forecasts],
+    }
+
+    for name, run in runs.items():
+      timings = []
+      for _ in range(options['repeat']):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+
+      tracemalloc.start()
+      run()
+      _, peak = tracemalloc.get_traced_memory()
+      tracemalloc.stop()
+
+      self.stdout.write(
+        f"{name:20} {statistics.median(timings) / n * 1e6:8.1f}us/forecast | "
+        f"peak {peak / n / 1024:6.1f} KiB/forecast"
+      )
@@ -0,0 +1,67 @@
+import random
+import statistics
+import time
+from difflib import get_close_matches
+
+from django.core.management.base import BaseCommand
+
+from weather.fuzzy_index import TrigramIndex
+
+SYLLABLES = ['an', 'ber', 'ca', 'dor', 'el', 'fa', 'gra', 'ham', 'is', 'jo', 'ka', 'lon', 'mar',
+             'no', 'os', 'pa', 'qu', 'ri', 'san', 'to', 'ul', 'vi', 'wick', 'xa', 'yo', 'zu']
+
+
+def make_name(rng):
+  words = rng.choice((1, 1, 1, 2))
+  return ' '.join(
+    ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+    for _ in range(words)
+  )
+
+
+def misspell(rng, name):
+  i = rng.randrange(len(name))
+  return name[:i] + rng.choice('aeiou') + name[i + 1:]
+
+
+class Command(BaseCommand):
+  help = "Benchmark the trigram fuzzy index against difflib.get_close_matches over growing name tables."
+
+  def add_arguments(self, parser):
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--max-linear', type=int, default=100000,
+                        help="Skip the O(N) difflib baseline above this many names.")
+    parser.add_argument('--seed', type=int, default=0)
+
+  def handle(self, *args, **options):
+    for size in options['sizes']:
+      rng = random.Random(options['seed'])
+      names = list({make_name(rng) for _ in range(size)})
+      queries = [misspell(rng, rng.choice(names)) for _ in range(options['queries'])]
+
+      started = time.perf_counter()
+      index = TrigramIndex()
+      for name in names:
+        index.add(name)
+      build = time.perf_counter() - started
+
+      indexed, results = [], []
+      for q in queries:
+        started = time.perf_counter()
+        results.append(index.search(q))
+        indexed.append(time.perf_counter() - started)
+      line = (f"{len(names):>8} names: build {build:.2f}s | "
+              f"index p50 {statistics.median(indexed) * 1000:.2f}ms max {max(indexed) * 1000:.2f}ms")
+
+      if len(names) <= options['max_linear']:
+        lower = [n.lower() for n in names]
+        linear, agree = [], 0
+        for q, found in zip(queries, results):
+          started = time.perf_counter()
+          match = get_close_matches(q.lower(), lower, n=1, cutoff=0.75)
+          linear.append(time.perf_counter() - started)
+          agree += (match[0] if match else None) == (found.lower() if found else None)
+        line += (f" | difflib p50 {statistics.median(linear) * 1000:.2f}ms"
+                 f" | same match {agree}/{len(queries)}")
+      self.stdout.write(line)
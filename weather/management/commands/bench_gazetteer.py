@@ -0,0 +1,60 @@
+import random
+import sqlite3
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from weather.gazetteer import Gazetteer
+
+
+def report(timings):
+  timings = sorted(timings)
+  p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+  return f"p50 {statistics.median(timings) * 1e6:.0f}us | p99 {p99 * 1e6:.0f}us | max {timings[-1] * 1e6:.0f}us"
+
+
+class Command(BaseCommand):
+  help = "Benchmark open time and lookup latency of the offline gazetteer on whatever dataset it was built from."
+
+  def add_arguments(self, parser):
+    parser.add_argument('--path', default=getattr(settings, 'GAZETTEER_PATH', None))
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+
+  def handle(self, *args, **options):
+    if not options['path']:
+      raise CommandError("Pass --path or set GAZETTEER_PATH.")
+    rng = random.Random(options['seed'])
+    n = options['queries']
+
+    # sample real keys straight from the file so hits are hits
+    raw = sqlite3.connect(f"file:{options['path']}?mode=ro", uri=True)
+    counts = {t: raw.execute(f'SELECT COUNT(*) FROM {t}').fetchone()[0] for t in ('places', 'postcodes', 'countries')}
+    names = [r[0] for r in raw.execute('SELECT name FROM places ORDER BY random() LIMIT ?', (n,))]
+    codes = [r[0] for r in raw.execute('SELECT code_key FROM postcodes ORDER BY random() LIMIT ?', (n,))]
+    countries = [r[0] for r in raw.execute('SELECT name FROM countries')]
+    raw.close()
+    self.stdout.write(', '.join(f"{v} {t}" for t, v in counts.items()))
+
+    started = time.perf_counter()
+    gazetteer = Gazetteer(options['path'])
+    gazetteer.lookup('London')
+    self.stdout.write(f"open + first lookup: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    misses = [''.join(rng.choice('bcdfghjklmnpqrstvwxz') for _ in range(8)) for _ in range(n)]
+    for label, queries, lookup in (
+      ('place names', names, gazetteer.lookup),
+      ('postcodes', codes, gazetteer.postcode),
+      ('countries', countries, gazetteer.lookup),
+      ('misses', misses, gazetteer.lookup),
+    ):
+      if not queries:
+        continue
+      timings, found = [], 0
+      for q in queries:
+        t = time.perf_counter()
+        found += lookup(q) is not None
+        timings.append(time.perf_counter() - t)
+      self.stdout.write(f"{label:12} {report(timings)} | {found}/{len(queries)} resolved")
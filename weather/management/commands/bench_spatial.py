@@ -0,0 +1,71 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from weather.spatial_index import GridIndex, haversine_km
+
+
+class Command(BaseCommand):
+  help = "Benchmark nearest-within-radius lookups on the location grid index against a linear scan."
+
+  def add_arguments(self, parser):
+    parser.add_argument('--points', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--radius', type=float, default=0.5, help="Search radius in km.")
+    parser.add_argument('--linear-queries', type=int, default=5,
+                        help="How many queries to also answer with an O(N) scan (0 to skip).")
+    parser.add_argument('--seed', type=int, default=0)
+
+  def handle(self, *args, **options):
+    rng = random.Random(options['seed'])
+    # cluster points around "cities" like real geocodes, plus uniform background noise
+    centres = [(rng.uniform(-60, 70), rng.uniform(-180, 180)) for _ in range(2000)]
+    points = []
+    for i in range(options['points']):
+      if i % 10 == 0:
+        points.append((rng.uniform(-90, 90), rng.uniform(-180, 180)))
+      else:
+        lat, lon = rng.choice(centres)
+        points.append((lat + rng.gauss(0, 0.2), (lon + rng.gauss(0, 0.2) + 180) % 360 - 180))
+
+    started = time.perf_counter()
+    grid = GridIndex()
+    for i, (lat, lon) in enumerate(points):
+      grid.add(i, lat, lon)
+    build = time.perf_counter() - started
+    self.stdout.write(f"built grid over {len(points)} points in {build:.2f}s")
+
+    radius = options['radius']
+    queries = []
+    for _ in range(options['queries']):
+      lat, lon = rng.choice(points)
+      queries.append((lat + rng.gauss(0, 0.002), lon + rng.gauss(0, 0.002)))
+
+    timings, results = [], []
+    for lat, lon in queries:
+      started = time.perf_counter()
+      results.append(grid.nearest(lat, lon, radius))
+      timings.append(time.perf_counter() - started)
+    found = sum(r is not None for r in results)
+    self.stdout.write(
+      f"grid: p50 {statistics.median(timings) * 1000:.3f}ms | max {max(timings) * 1000:.3f}ms | "
+      f"{found}/{len(queries)} within {radius} km"
+    )
+
+    n_linear = min(options['linear_queries'], len(queries))
+    if n_linear:
+      timings, agree = [], 0
+      for (lat, lon), result in zip(queries[:n_linear], results):
+        started = time.perf_counter()
+        best = None
+        for i, (p_lat, p_lon) in enumerate(points):
+          d = haversine_km(lat, lon, p_lat, p_lon)
+          if d <= radius and (best is None or d < best[1]):
+            best = (i, d)
+        timings.append(time.perf_counter() - started)
+        agree += (best and best[0]) == (result and result[0])
+      self.stdout.write(
+        f"linear scan: p50 {statistics.median(timings) * 1000:.1f}ms | same answer {agree}/{n_linear}"
+      )
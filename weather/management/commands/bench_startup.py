@@ -0,0 +1,55 @@
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Each sample runs in a fresh interpreter so import caches don't skew the numbers
+STARTUP_SCRIPT = """
+import os, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weather_app.settings')
+import django
+django.setup()
+import weather.urls
+ready = time.perf_counter() - started
+torch_loaded = 'torch' in sys.modules
+loaded = -1.0
+if {load_model}:
+  from weather.ml_utils import load_classifier
+  load_classifier()
+  loaded = time.perf_counter() - started
+print(ready, loaded, torch_loaded)
+"""
+
+
+class Command(BaseCommand):
+  help = "Measure Django startup time with lazy classifier loading vs loading the model up front."
+
+  def add_arguments(self, parser):
+    parser.add_argument('--runs', type=int, default=5)
+
+  def sample(self, load_model):
+    script = STARTUP_SCRIPT.format(load_model=load_model)
+    out = subprocess.run(
+      [sys.executable, '-c', script],
+      cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(out[0]), float(out[1]), out[2] == 'True'
+
+  def handle(self, *args, **options):
+    runs = options['runs']
+
+    lazy = [self.sample(load_model=False) for _ in range(runs)]
+    ready_times = [r[0] for r in lazy]
+    self.stdout.write(f"lazy startup (django.setup + URLconf): median {statistics.median(ready_times):.3f}s over {runs} runs")
+    self.stdout.write(f"torch imported at startup: {any(r[2] for r in lazy)}")
+
+    try:
+      eager = [self.sample(load_model=True) for _ in range(runs)]
+    except subprocess.CalledProcessError as e:
+      self.stderr.write(f"could not load the classifier for the eager comparison:\n{e.stderr.strip().splitlines()[-1]}")
+      return
+    eager_times = [r[1] for r in eager]
+    self.stdout.write(f"startup + model load (previous behaviour): median {statistics.median(eager_times):.3f}s over {runs} runs")
@@ -0,0 +1,44 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from weather.gazetteer import build_gazetteer
+
+
+class Command(BaseCommand):
+  help = (
+    "Build the offline geocoding gazetteer (an indexed SQLite file) from GeoNames dumps, "
+    "e.g. allCountries.txt or cities500.txt, the postal code allCountries.txt and countryInfo.txt."
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('cities', help="GeoNames places TSV (19 columns).")
+    parser.add_argument('--postcodes', help="GeoNames postal code TSV (12 columns).")
+    parser.add_argument('--countries', help="GeoNames countryInfo.txt.")
+    parser.add_argument('--output', default=getattr(settings, 'GAZETTEER_PATH', None),
+                        help="SQLite file to write (defaults to settings.GAZETTEER_PATH).")
+    parser.add_argument('--min-population', type=int, default=0,
+                        help="Skip smaller places to keep the file compact.")
+    parser.add_argument('--alternate-names', action='store_true',
+                        help="Also index every alternate name (much larger file).")
+
+  def handle(self, *args, **options):
+    if not options['output']:
+      raise CommandError("Pass --output or set GAZETTEER_PATH.")
+
+    started = time.perf_counter()
+    counts = build_gazetteer(
+      options['output'], options['cities'],
+      postcodes=options['postcodes'], countries=options['countries'],
+      min_population=options['min_population'], alternate_names=options['alternate_names'],
+    )
+    elapsed = time.perf_counter() - started
+    rows = sum(counts.values())
+    size_mb = os.path.getsize(options['output']) / 1e6
+    summary = ', '.join(f"{n} {table}" for table, n in counts.items())
+    self.stdout.write(self.style.SUCCESS(
+      f"Built {options['output']} ({size_mb:.1f} MB): {summary} in {elapsed:.1f}s "
+      f"({rows / max(elapsed, 1e-9):,.0f} rows/s)"
+    ))
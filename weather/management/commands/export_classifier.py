@@ -0,0 +1,36 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from weather.ml_backends import export_onnx, export_quantized
+from weather.ml_utils import classifier_artifact_dir, model_path
+
+
+class Command(BaseCommand):
+  help = "Export the address classifier to an int8-quantized PyTorch or ONNX Runtime artifact."
+
+  def add_arguments(self, parser):
+    parser.add_argument('--format', choices=['quantized', 'onnx'], default='quantized')
+    parser.add_argument(
+      '--output', default=None,
+      help="Directory for the artifact (default: ADDRESS_CLASSIFIER_ARTIFACT_DIR, else the model directory)."
+    )
+    parser.add_argument('--quantize', action='store_true', help="Also int8-quantize the ONNX graph (onnx format only).")
+
+  def handle(self, *args, **options):
+    output_dir = options['output'] or classifier_artifact_dir()
+    os.makedirs(output_dir, exist_ok=True)
+
+    try:
+      if options['format'] == 'quantized':
+        path = export_quantized(model_path, output_dir)
+      else:
+        path = export_onnx(model_path, output_dir, quantize=options['quantize'])
+    except ImportError as e:
+      raise CommandError(f"Missing dependency for {options['format']} export: {e}")
+
+    size_mb = os.path.getsize(path) / 1e6
+    self.stdout.write(self.style.SUCCESS(f"Wrote {path} ({size_mb:.1f} MB)"))
+    self.stdout.write(f"Set ADDRESS_CLASSIFIER_BACKEND = '{options['format']}' to serve it.")
+    if os.path.abspath(output_dir) != os.path.abspath(classifier_artifact_dir()):
+      self.stdout.write(f"Also set ADDRESS_CLASSIFIER_ARTIFACT_DIR = '{output_dir}'; it is loaded from there.")
@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from weather.models import RawPayload, WeatherQuery
+
+
+class Command(BaseCommand):
+  help = "Drop audit payloads of queries older than the retention period, then delete unreferenced payloads."
+
+  def add_arguments(self, parser):
+    parser.add_argument('--days', type=int, default=30, help="Keep payloads of queries created in the last N days.")
+    parser.add_argument('--dry-run', action='store_true')
+
+  def handle(self, *args, **options):
+    cutoff = timezone.now() - timedelta(days=options['days'])
+    expired = WeatherQuery.objects.filter(created_at__lt=cutoff, raw_payload__isnull=False)
+
+    with transaction.atomic():
+      detached = expired.update(raw_payload=None, updated_at=timezone.now())
+      # payloads still referenced by a query inside the retention window are kept
+      removed, _ = RawPayload.objects.filter(queries__isnull=True).delete()
+      if options['dry_run']:
+        transaction.set_rollback(True)
+
+    prefix = "[dry run] " if options['dry_run'] else ""
+    self.stdout.write(self.style.SUCCESS(
+      f"{prefix}Detached payloads from {detached} queries; deleted {removed} unreferenced payloads."
+    ))
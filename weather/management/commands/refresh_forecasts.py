@@ -0,0 +1,68 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from weather.fetch_weather import fetch_openweather_forecast
+from weather.models import Location
+from weather.ratelimit import RateLimiter
+from weather.services import forecast_day_records, upsert_weather_records, watched_locations
+from weather.views import process_forecast_data
+
+# Background refreshes only touch the weather values, never which query a record belongs to
+REFRESH_FIELDS = ['temp_c', 'temp_f', 'description', 'updated_at']
+
+
+class Command(BaseCommand):
+  help = (
+    "Long-running worker that keeps forecasts for the most-queried locations fresh, "
+    "so user requests find WeatherRecords (and cached responses) already in place."
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--interval', type=int, default=900, help="Seconds between refresh cycles.")
+    parser.add_argument('--limit', type=int, default=50, help="Locations refreshed per cycle.")
+    parser.add_argument('--max-age', type=int, default=60, help="Minutes before a location's forecast is stale.")
+    parser.add_argument('--rate', type=float, default=1.0, help="Upstream requests per second.")
+    parser.add_argument('--once', action='store_true', help="Run a single cycle and exit.")
+
+  def refresh(self, location):
+    forecast_json = fetch_openweather_forecast(location.latitude, location.longitude)
+    days = process_forecast_data(forecast_json)
+    upsert_weather_records(forecast_day_records(location, days), update_fields=REFRESH_FIELDS)
+    now = timezone.now()
+    Location.objects.filter(pk=location.pk).update(forecast_refreshed_at=now, updated_at=now)
+    return len(days)
+
+  def run_cycle(self, limiter, limit, max_age):
+    refreshed = failed = 0
+    for location in watched_locations(limit, max_age):
+      limiter.acquire()
+      try:
+        days = self.refresh(location)
+      except Exception as e:
+        failed += 1
+        self.stderr.write(f"{location.name}: {e}")
+        continue
+      refreshed += 1
+      self.stdout.write(f"{location.name}: {days} days ({location.query_count} queries)")
+    return refreshed, failed
+
+  def handle(self, *args, **options):
+    limiter = RateLimiter(options['rate'])
+    max_age = timedelta(minutes=options['max_age'])
+    try:
+      while True:
+        close_old_connections()
+        started = time.monotonic()
+        refreshed, failed = self.run_cycle(limiter, options['limit'], max_age)
+        self.stdout.write(self.style.SUCCESS(
+          f"Refreshed {refreshed} locations ({failed} failed) in {time.monotonic() - started:.1f}s"
+        ))
+        if options['once']:
+          break
+        time.sleep(max(0, options['interval'] - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+      self.stdout.write("Stopping.")
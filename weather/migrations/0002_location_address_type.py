@@ -0,0 +1,41 @@
+from django.db import migrations, models
+
+
+def normalize(name):
+    return ' '.join(name.lower().split())
+
+
+def fill_name_keys(apps, schema_editor):
+    Location = apps.get_model('weather', 'Location')
+    for loc in Location.objects.only('pk', 'name', 'country').iterator(chunk_size=500):
+        key = normalize(loc.name)
+        # only a name that is its own country is known here; the rest go to the classifier
+        address_type = 'Country' if key == normalize(loc.country) else ''
+        Location.objects.filter(pk=loc.pk).update(name_key=key, address_type=address_type)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='name_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='address_type',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='country',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.RunPython(fill_name_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0002_location_address_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='forecast_refreshed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
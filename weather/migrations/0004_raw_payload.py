@@ -0,0 +1,57 @@
+import hashlib
+import json
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_raw_responses(apps, schema_editor):
+    WeatherQuery = apps.get_model('weather', 'WeatherQuery')
+    RawPayload = apps.get_model('weather', 'RawPayload')
+    queries = WeatherQuery.objects.exclude(raw_response=None).only('pk', 'raw_response')
+    for query in queries.iterator(chunk_size=500):
+        raw = json.dumps(query.raw_response, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        payload, _ = RawPayload.objects.get_or_create(
+            content_hash=hashlib.sha256(raw).hexdigest(),
+            defaults={'data': zlib.compress(raw, 6), 'size': len(raw)},
+        )
+        WeatherQuery.objects.filter(pk=query.pk).update(raw_payload=payload)
+
+
+def restore_raw_responses(apps, schema_editor):
+    WeatherQuery = apps.get_model('weather', 'WeatherQuery')
+    queries = WeatherQuery.objects.exclude(raw_payload=None).select_related('raw_payload')
+    for query in queries.iterator(chunk_size=500):
+        query.raw_response = json.loads(zlib.decompress(bytes(query.raw_payload.data)))
+        query.save(update_fields=['raw_response'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0003_location_forecast_refreshed_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RawPayload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='weatherquery',
+            name='raw_payload',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='queries', to='weather.rawpayload'),
+        ),
+        migrations.RunPython(move_raw_responses, restore_raw_responses),
+        migrations.RemoveField(
+            model_name='weatherquery',
+            name='raw_response',
+        ),
+    ]
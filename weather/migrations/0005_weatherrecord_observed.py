@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0004_raw_payload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weatherrecord',
+            name='observed',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0006_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weatherquery',
+            name='best_day',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='weatherquery',
+            name='best_temp',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='weatherquery',
+            index=models.Index(fields=['best_temp'], name='weather_wea_best_te_cd224b_idx'),
+        ),
+    ]
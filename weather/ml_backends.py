@@ -0,0 +1,161 @@
+"""
+Inference backends for the address classifier.
+
+'torch'     - the fp32 RobertaForSequenceClassification weights (default)
+'quantized' - dynamically quantized int8 Linear layers, exported by
+              `manage.py export_classifier --format quantized`
+'onnx'      - an ONNX Runtime session, exported by
+              `manage.py export_classifier --format onnx`
+
+torch, transformers and onnxruntime are imported inside the functions so the
+module itself is cheap to import.
+"""
+import os
+
+BACKENDS = ('torch', 'quantized', 'onnx')
+QUANTIZED_FILE = 'model_int8.pt'
+ONNX_FILE = 'model.onnx'
+MAX_LENGTH = 32
+
+
+def _tokenizer(model_path):
+    from transformers import RobertaTokenizerFast
+    return RobertaTokenizerFast.from_pretrained(model_path)
+
+
+def _encode(tokenizer, addresses, return_tensors):
+    return tokenizer(
+        addresses,
+        padding=True,  # pad to the longest string in the batch, not max_length
+        truncation=True,
+        max_length=MAX_LENGTH,
+        return_tensors=return_tensors
+    )
+
+
+def _quantize(model):
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _torch_predictor(model, tokenizer, device):
+    import torch
+
+    def predict_ids(addresses):
+        inputs = _encode(tokenizer, addresses, 'pt')
+        # Move inputs to the same device as the model
+        inputs = {k: v.to(device) for k, v in inputs.items()}
+        with torch.no_grad():
+            logits = model(**inputs).logits
+        return logits.argmax(dim=-1).tolist()
+
+    return predict_ids
+
+
+def load_torch(model_path):
+    import torch
+    from transformers import RobertaForSequenceClassification
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    model = RobertaForSequenceClassification.from_pretrained(model_path)
+    model.to(device)
+    model.eval()
+    return _torch_predictor(model, _tokenizer(model_path), device)
+
+
+def load_quantized(model_path, artifact_dir):
+    import torch
+    from transformers import RobertaConfig, RobertaForSequenceClassification
+
+    artifact = os.path.join(artifact_dir, QUANTIZED_FILE)
+    if not os.path.exists(artifact):
+        raise FileNotFoundError(f"Quantized model not found: {artifact} (run manage.py export_classifier --format quantized)")
+
+    # Build the architecture from config only; the int8 weights come from the artifact
+    model = RobertaForSequenceClassification(RobertaConfig.from_pretrained(model_path))
+    model.eval()
+    model = _quantize(model)
+    # the artifact holds packed int8 params, which weights_only loading rejects; it is produced locally
+    model.load_state_dict(torch.load(artifact, map_location='cpu', weights_only=False))
+    return _torch_predictor(model, _tokenizer(model_path), torch.device('cpu'))
+
+
+def load_onnx(model_path, artifact_dir):
+    import onnxruntime
+
+    artifact = os.path.join(artifact_dir, ONNX_FILE)
+    if not os.path.exists(artifact):
+        raise FileNotFoundError(f"ONNX model not found: {artifact} (run manage.py export_classifier --format onnx)")
+
+    session = onnxruntime.InferenceSession(artifact, providers=['CPUExecutionProvider'])
+    input_names = {i.name for i in session.get_inputs()}
+    tokenizer = _tokenizer(model_path)
+
+    def predict_ids(addresses):
+        inputs = _encode(tokenizer, addresses, 'np')
+        feed = {k: v for k, v in inputs.items() if k in input_names}
+        logits = session.run(None, feed)[0]
+        return logits.argmax(axis=-1).tolist()
+
+    return predict_ids
+
+
+def load_backend(backend, model_path, artifact_dir=None):
+    """Return predict_ids(addresses) -> list of label ids for the chosen backend."""
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model directory not found: {model_path}")
+    artifact_dir = artifact_dir or model_path
+
+    if backend == 'torch':
+        return load_torch(model_path)
+    if backend == 'quantized':
+        return load_quantized(model_path, artifact_dir)
+    if backend == 'onnx':
+        return load_onnx(model_path, artifact_dir)
+    raise ValueError(f"Unknown classifier backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+
+
+def export_quantized(model_path, output_dir):
+    """Save a dynamically quantized (int8 Linear layers) state dict; return its path."""
+    import torch
+    from transformers import RobertaForSequenceClassification
+
+    model = RobertaForSequenceClassification.from_pretrained(model_path)
+    model.eval()
+    output = os.path.join(output_dir, QUANTIZED_FILE)
+    torch.save(_quantize(model).state_dict(), output)
+    return output
+
+
+def export_onnx(model_path, output_dir, quantize=False):
+    """Export the fp32 model to ONNX (optionally int8-quantized by ONNX Runtime); return its path."""
+    import torch
+    from transformers import RobertaForSequenceClassification
+
+    model = RobertaForSequenceClassification.from_pretrained(model_path)
+    model.config.return_dict = False
+    model.eval()
+
+    sample = _encode(_tokenizer(model_path), ['London', '48.85, 2.35'], 'pt')
+    output = os.path.join(output_dir, ONNX_FILE)
+    fp32_output = output + '.fp32' if quantize else output
+    torch.onnx.export(
+        model,
+        (sample['input_ids'], sample['attention_mask']),
+        fp32_output,
+        input_names=['input_ids', 'attention_mask'],
+        output_names=['logits'],
+        dynamic_axes={
+            'input_ids': {0: 'batch', 1: 'sequence'},
+            'attention_mask': {0: 'batch', 1: 'sequence'},
+            'logits': {0: 'batch'},
+        },
+        opset_version=17,
+        dynamo=False,
+    )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_output, output, weight_type=QuantType.QInt8)
+        os.remove(fp32_output)
+    return output
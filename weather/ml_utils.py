@@ -1,25 +1,52 @@
 import os
-import torch
-from transformers import RobertaForSequenceClassification, RobertaTokenizerFast
+import bisect
+import hashlib
+import queue
+import threading
+import time
+from concurrent.futures import Future
 from django.conf import settings
+from django.core.cache import caches
+from .address_rules import fast_classify
+from .cache_utils import LRUCache
+from .ml_backends import load_backend
 
-try:
-    # Define model path
-    model_path = os.path.join(settings.BASE_DIR, 'weather', 'models', 'address_classifier')
-    if not os.path.exists(model_path):
-        raise FileNotFoundError(f"Model directory not found: {model_path}")
-    
-except Exception as e:
-    raise
+# torch and transformers are imported on first use (see load_classifier) so that
+# migrations, the admin and views that never classify don't pay for them.
+model_path = getattr(
+    settings, 'ADDRESS_CLASSIFIER_PATH',
+    os.path.join(settings.BASE_DIR, 'weather', 'models', 'address_classifier')
+)
 
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+_classifier = None  # predict_ids(addresses) once loaded
+_classifier_lock = threading.Lock()
 
-tokenizer = RobertaTokenizerFast.from_pretrained(model_path)
+def classifier_backend():
+    return getattr(settings, 'ADDRESS_CLASSIFIER_BACKEND', 'torch')
 
-# Load model
-model = RobertaForSequenceClassification.from_pretrained(model_path)
-model.to(device)
-model.eval()
+def classifier_artifact_dir():
+    """Where the quantized/ONNX artifacts live (export_classifier's default --output)."""
+    return getattr(settings, 'ADDRESS_CLASSIFIER_ARTIFACT_DIR', None) or model_path
+
+def load_classifier():
+    """Load the configured backend once per process (thread-safe) and return its predict_ids callable."""
+    global _classifier
+    if _classifier is not None:
+        return _classifier
+
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = load_backend(classifier_backend(), model_path, classifier_artifact_dir())
+    return _classifier
+
+def warm_up():
+    """Load the classifier and run one prediction so the first request doesn't pay for it."""
+    predict_batch(['London'])
+
+def start_warm_up():
+    """Warm the classifier up in a background thread if settings.ADDRESS_CLASSIFIER_WARMUP is on."""
+    if getattr(settings, 'ADDRESS_CLASSIFIER_WARMUP', False):
+        threading.Thread(target=warm_up, name='address-classifier-warmup', daemon=True).start()
 
 # Define labels
 labels = {
@@ -31,33 +58,166 @@ labels = {
     'Landmarks': 5
 }
 
-def classify_address(address):
-    try:
-        inputs = tokenizer(
-            address, 
-            padding="max_length", 
-            truncation=True, 
-            max_length=32, 
-            return_tensors="pt"
-        )
-        
-        # Move inputs to the same device as the model
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-        
-        # Perform inference
-        with torch.no_grad():
-            outputs = model(**inputs)
-            logits = outputs.logits
-            pred_id = logits.argmax(dim=-1).item()
-        
-        # Convert prediction ID to label
-        id2label = {v: k for k, v in labels.items()}
-        predicted_type = id2label[pred_id]
-        
-        return predicted_type
-        
-    except Exception as e:
-        raise
+id2label = {v: k for k, v in labels.items()}
+
+# Micro-batching: concurrent callers are coalesced into one forward pass
+MAX_BATCH_SIZE = 32
+MAX_BATCH_WAIT = 0.005  # seconds to wait for more requests before running a batch
+CLASSIFY_TIMEOUT = 30  # seconds a caller waits for its batch (the first one also loads the model)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)  # seconds
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.n = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.n += 1
+            self.total += value
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f'<={b}' for b in self.buckets] + [f'>{self.buckets[-1]}']
+            return {
+                'count': self.n,
+                'mean': self.total / self.n if self.n else 0.0,
+                'buckets': dict(zip(labels, self.counts)),
+            }
+
+
+def predict_batch(addresses):
+    """Classify a list of address strings in a single forward pass."""
+    pred_ids = load_classifier()(addresses)
+
+    # Convert prediction IDs to labels
+    return [id2label[pred_id] for pred_id in pred_ids]
+
+
+class BatchingClassifier:
+    """
+    Collects classification requests from concurrent threads for up to
+    max_wait seconds (or max_batch_size requests) and runs them as one batch.
+    Callers get a Future per address.
+    """
+
+    def __init__(self, predict, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_BATCH_WAIT):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.batch_latency = Histogram(LATENCY_BUCKETS)
+        self.request_latency = Histogram(LATENCY_BUCKETS)
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def submit(self, address):
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((address, future, time.perf_counter()))
+        return future
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name='address-classifier', daemon=True)
+                    self._worker.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            try:
+                results = self.predict([address for address, _, _ in batch])
+                if len(results) != len(batch):
+                    # results can't be matched to callers; fail them all rather than leave any waiting
+                    raise RuntimeError(f'Classifier returned {len(results)} results for {len(batch)} addresses')
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+            self.batch_sizes.observe(len(batch))
+            self.batch_latency.observe(finished - started)
+            for (_, future, enqueued), result in zip(batch, results):
+                self.request_latency.observe(finished - enqueued)
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            'batch_size': self.batch_sizes.snapshot(),
+            'batch_latency': self.batch_latency.snapshot(),
+            'request_latency': self.request_latency.snapshot(),
+        }
+
+
+_batcher = BatchingClassifier(predict_batch)
+
+def classify_address(address, timeout=CLASSIFY_TIMEOUT):
+    return _batcher.submit(address).result(timeout=timeout)
+
+def classifier_stats():
+    return _batcher.stats()
+
+# Memoized model predictions, keyed on normalized input. Optionally mirrored to a
+# Django cache (settings.ADDRESS_CLASSIFIER_CACHE_ALIAS) so all workers share them.
+_predictions = LRUCache(maxsize=getattr(settings, 'ADDRESS_CLASSIFIER_CACHE_SIZE', 4096))
+
+def normalize_address(address):
+    return ' '.join(address.lower().split())
+
+def _shared_cache():
+    alias = getattr(settings, 'ADDRESS_CLASSIFIER_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+def _shared_key(key):
+    return 'addrtype:' + hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def classify_address_cached(address):
+    key = normalize_address(address)
+    address_type = _predictions.get(key)
+    if address_type is not None:
+        return address_type
+
+    shared = _shared_cache()
+    if shared is not None:
+        address_type = shared.get(_shared_key(key))
+
+    if address_type is None:
+        address_type = classify_address(address)
+        if shared is not None:
+            shared.set(_shared_key(key), address_type, None)
+    _predictions.set(key, address_type)
+    return address_type
+
+def prediction_cache_stats():
+    return _predictions.stats()
 
 def classify_address_type(address):
-    return classify_address(address)
+    # Coordinates, postal codes and known places are decided by cheap rules;
+    # only ambiguous input reaches the (memoized) model
+    address_type = fast_classify(address)
+    if address_type is None:
+        address_type = classify_address_cached(address)
+    return address_type
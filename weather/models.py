@@ -1,17 +1,80 @@
+import hashlib
+import json
+import zlib
+
 from django.db import models
 from django.utils import timezone
 
+from .fuzzy_index import normalize
+
 class Location(models.Model):
   name = models.CharField(max_length=200, db_index=True)
+  name_key = models.CharField(max_length=200, db_index=True, editable=False)  # normalize(name), for exact lookups
   display_name = models.CharField(max_length=400, blank=True)
   latitude = models.FloatField()
   longitude = models.FloatField()
-  country = models.CharField(max_length=100, blank=True)
+  country = models.CharField(max_length=100, db_index=True, blank=True)
+  # 'City' or 'Country' when geocoding showed the name is one, else '' (landmarks, districts, ...)
+  address_type = models.CharField(max_length=20, blank=True)
   geocoded_at = models.DateTimeField(auto_now_add=True)
+  forecast_refreshed_at = models.DateTimeField(null=True, blank=True)  # last background refresh
+  updated_at = models.DateTimeField(auto_now=True)  # API Last-Modified / ETag
+
+  def save(self, *args, **kwargs):
+    self.name_key = normalize(self.name)
+    super().save(*args, **kwargs)
 
   def __str__(self):
     return self.display_name or self.name
 
+class GeocodeResult(models.Model):
+  # persistent Nominatim cache (see geocoder.py); found=False rows cache "no match"
+  query = models.CharField(max_length=400, unique=True)  # fuzzy_index.normalize()d input
+  found = models.BooleanField()
+  latitude = models.FloatField(null=True, blank=True)
+  longitude = models.FloatField(null=True, blank=True)
+  display_name = models.CharField(max_length=400, blank=True)
+  country = models.CharField(max_length=100, blank=True)
+  city = models.CharField(max_length=200, blank=True)
+  fetched_at = models.DateTimeField(default=timezone.now)
+  expires_at = models.DateTimeField(db_index=True)
+
+  def __str__(self):
+    return f'{self.query} -> {self.display_name or "not found"}'
+
+class RawPayload(models.Model):
+  # compressed upstream JSON (audit), shared by every query that received identical content
+  content_hash = models.CharField(max_length=64, unique=True)  # sha256 of the canonical JSON
+  data = models.BinaryField()  # zlib-compressed JSON
+  size = models.PositiveIntegerField()  # uncompressed bytes
+  created_at = models.DateTimeField(auto_now_add=True)
+
+  @staticmethod
+  def encode(payload):
+    raw = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(raw).hexdigest(), zlib.compress(raw, 6), len(raw)
+
+  @classmethod
+  def store(cls, payload):
+    """Return the RawPayload for this JSON, creating it only if the content is new."""
+    content_hash, data, size = cls.encode(payload)
+    obj, _ = cls.objects.get_or_create(content_hash=content_hash, defaults={'data': data, 'size': size})
+    return obj
+
+  @classmethod
+  def store_many(cls, payloads):
+    """Like store() for a list of payloads, in two statements; returns RawPayloads in order."""
+    encoded = [cls.encode(p) for p in payloads]
+    cls.objects.bulk_create(
+      [cls(content_hash=h, data=d, size=n) for h, d, n in encoded],
+      ignore_conflicts=True
+    )
+    by_hash = cls.objects.in_bulk([h for h, _, _ in encoded], field_name='content_hash')
+    return [by_hash[h] for h, _, _ in encoded]
+
+  def load(self):
+    return json.loads(zlib.decompress(bytes(self.data)))
+
 class WeatherQuery(models.Model):
   # a user request to fetch weather for a location/date-range
   location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='queries')
@@ -19,14 +82,24 @@ class WeatherQuery(models.Model):
   end_date = models.DateField()
   created_at = models.DateTimeField(default=timezone.now)
   requester = models.CharField(max_length=150, blank=True)  # optional: username/email
-  raw_response = models.JSONField(null=True, blank=True)  # Full API response (audit)
+  raw_payload = models.ForeignKey(RawPayload, on_delete=models.SET_NULL, null=True, blank=True, related_name='queries')  # Full API response (audit)
   notes = models.TextField(blank=True)
+  updated_at = models.DateTimeField(auto_now=True)  # API Last-Modified / ETag
+  # the record closest to services.COMFORT_TEMP, kept up to date by services.refresh_best_days
+  best_day = models.DateField(null=True, blank=True)
+  best_temp = models.FloatField(null=True, blank=True)
 
   class Meta:
     indexes = [
       models.Index(fields=['start_date','end_date']),
+      models.Index(fields=['best_temp']),
     ]
 
+  @property
+  def raw_response(self):
+    # loads (one query) and decompresses the payload; list views never touch it
+    return self.raw_payload.load() if self.raw_payload_id else None
+
 class WeatherRecord(models.Model):
   # one row per date (normalized)
   location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='weather_records')
@@ -35,7 +108,9 @@ class WeatherRecord(models.Model):
   temp_f = models.FloatField(null=True, blank=True)
   description = models.CharField(max_length=200, blank=True)
   source_query = models.ForeignKey(WeatherQuery, on_delete=models.SET_NULL, null=True, blank=True)
+  observed = models.BooleanField(default=False)  # archived historical value, never re-fetched (forecasts are False)
   created_at = models.DateTimeField(auto_now_add=True)
+  updated_at = models.DateTimeField(auto_now=True)  # API Last-Modified / ETag
 
   class Meta:
     unique_together = ('location','date')
@@ -0,0 +1,36 @@
+import threading
+import time
+
+
+class RateLimiter:
+  """
+  Thread-safe token bucket: `rate` calls per second on average, with bursts of
+  up to `burst`. acquire() blocks callers in turn instead of failing them.
+  """
+
+  def __init__(self, rate, burst=1):
+    self.rate = float(rate)
+    self.burst = burst
+    self._tokens = float(burst)
+    self._updated = time.monotonic()
+    self._lock = threading.Lock()
+
+  def _refill(self, now):
+    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+    self._updated = now
+
+  def acquire(self, timeout=None):
+    """Take one token, waiting up to `timeout` seconds (forever if None). Returns False on timeout."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+      with self._lock:
+        now = time.monotonic()
+        self._refill(now)
+        if self._tokens >= 1:
+          self._tokens -= 1
+          return True
+        wait = (1 - self._tokens) / self.rate
+      if deadline is not None:
+        if now + wait > deadline:
+          return False
+      time.sleep(wait)
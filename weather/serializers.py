@@ -1,12 +1,37 @@
 from rest_framework import serializers
 from .models import WeatherQuery, WeatherRecord, Location
 
-class LocationSerializer(serializers.ModelSerializer):
+def requested_fields(request):
+  """The ?fields=a,b sparse fieldset of a request as a set, or None when not given."""
+  fields = request.query_params.get('fields') if request is not None else None
+  if not fields:
+    return None
+  return {f.strip() for f in fields.split(',') if f.strip()}
+
+class SparseFieldsMixin:
+  """
+  ?fields=a,b limits the output to those fields. Fields in Meta.opt_in_fields
+  are expensive to produce and only included when listed explicitly.
+  """
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    wanted = requested_fields(self.context.get('request'))
+    opt_in = getattr(self.Meta, 'opt_in_fields', ())
+    for name in list(self.fields):
+      if (name not in wanted) if wanted is not None else (name in opt_in):
+        self.fields.pop(name)
+
+class LocationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
   class Meta: model = Location; fields = '__all__'
 
-class WeatherRecordSerializer(serializers.ModelSerializer):
+class WeatherRecordSerializer(SparseFieldsMixin, serializers.ModelSerializer):
   class Meta: model = WeatherRecord; fields = '__all__'
 
-class WeatherQuerySerializer(serializers.ModelSerializer):
+class NestedRecordSerializer(serializers.ModelSerializer):
+  class Meta: model = WeatherRecord; exclude = ('location', 'source_query')
+
+class WeatherQuerySerializer(SparseFieldsMixin, serializers.ModelSerializer):
   location = LocationSerializer()
-  class Meta: model = WeatherQuery; fields = '__all__'
+  records = NestedRecordSerializer(source='weatherrecord_set', many=True, read_only=True)
+  raw_response = serializers.JSONField(read_only=True)
+  class Meta: model = WeatherQuery; fields = '__all__'; opt_in_fields = ('records', 'raw_response')
@@ -0,0 +1,142 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Location, WeatherQuery, WeatherRecord
+from .signals import invalidate_home
+
+COMFORT_TEMP = 20.0 # °C target for "most temperate" day
+# Fields refreshed when a (location, date) row already exists
+RECORD_UPDATE_FIELDS = ['temp_c', 'temp_f', 'description', 'source_query', 'observed', 'updated_at']
+UPSERT_BATCH_SIZE = 500
+
+# Celsius to Fahrenheit
+def c_to_f(c):
+  if c is None:
+    return None
+  return round(c * 9.0 / 5.0 + 32.0, 1)
+
+def forecast_day_records(location, days, source_query=None):
+  """Build unsaved WeatherRecords from process_forecast_data() (or history) days."""
+  records = []
+  for day in days:
+    # convert 'YYYY-MM-DD' to date object (safe)
+    try:
+      date_obj = date.fromisoformat(day['date'])
+    except Exception:
+      date_obj = day['date']
+    records.append(WeatherRecord(
+      location=location,
+      date=date_obj,
+      temp_c=day.get('temperature'),
+      temp_f=c_to_f(day.get('temperature')),
+      description=day.get('description', ''),
+      source_query=source_query,
+      observed=day.get('observed', False)
+    ))
+  return records
+
+def missing_date_ranges(location, start_date, end_date):
+  """
+  Return the (start, end) date ranges within [start_date, end_date] that have
+  no observed WeatherRecord for this location yet, oldest first.
+  """
+  stored = set(
+    WeatherRecord.objects
+    .filter(location=location, date__range=(start_date, end_date), observed=True)
+    .values_list('date', flat=True)
+  )
+  gaps = []
+  day = start_date
+  while day <= end_date:
+    if day in stored:
+      day += timedelta(days=1)
+      continue
+    gap_start = day
+    while day <= end_date and day not in stored:
+      day += timedelta(days=1)
+    gaps.append((gap_start, day - timedelta(days=1)))
+  return gaps
+
+def upsert_weather_records(records, batch_size=UPSERT_BATCH_SIZE, update_fields=RECORD_UPDATE_FIELDS):
+  """
+  Insert WeatherRecords, or update update_fields on the existing row for the same
+  (location, date), in one INSERT ... ON CONFLICT statement per batch_size rows.
+  Records may span any number of locations. The best day of every query that
+  gains, loses or updates a record is recomputed.
+  """
+  if not records:
+    return records
+  affected = current_owners(records) | {r.source_query_id for r in records}
+  records = WeatherRecord.objects.bulk_create(
+    records,
+    batch_size=batch_size,
+    update_conflicts=True,
+    unique_fields=['location', 'date'],
+    update_fields=update_fields,
+  )
+  refresh_best_days(affected)
+  invalidate_home()
+  return records
+
+def current_owners(records):
+  """Ids of the queries that currently own the stored rows for these records' (location, date)."""
+  dates = defaultdict(set)
+  for r in records:
+    dates[r.location_id].add(r.date)
+  rows = Q()
+  for location_id, days in dates.items():
+    rows |= Q(location_id=location_id, date__in=days)
+  return set(
+    WeatherRecord.objects.filter(rows, source_query__isnull=False)
+    .values_list('source_query_id', flat=True).distinct()
+  )
+
+def refresh_best_days(query_ids, batch_size=UPSERT_BATCH_SIZE):
+  """
+  Recompute WeatherQuery.best_day/best_temp (the record closest to COMFORT_TEMP,
+  earliest on ties) from the queries' records, saving only the ones that changed.
+  Returns how many queries were updated.
+  """
+  query_ids = sorted(pk for pk in set(query_ids) if pk is not None)
+  updated = 0
+  for i in range(0, len(query_ids), batch_size):
+    chunk = query_ids[i:i + batch_size]
+    best = {}  # query id -> (date, temp_c)
+    rows = (
+      WeatherRecord.objects
+      .filter(source_query_id__in=chunk, temp_c__isnull=False)
+      .order_by('source_query_id', 'date')
+      .values_list('source_query_id', 'date', 'temp_c')
+    )
+    for query_id, day, temp in rows:
+      current = best.get(query_id)
+      if current is None or abs(temp - COMFORT_TEMP) < abs(current[1] - COMFORT_TEMP):
+        best[query_id] = (day, temp)
+
+    now = timezone.now()
+    changed = []
+    for wq in WeatherQuery.objects.filter(pk__in=chunk).only('pk', 'best_day', 'best_temp'):
+      day, temp = best.get(wq.pk, (None, None))
+      if (wq.best_day, wq.best_temp) != (day, temp):
+        wq.best_day, wq.best_temp, wq.updated_at = day, temp, now
+        changed.append(wq)
+    WeatherQuery.objects.bulk_update(changed, ['best_day', 'best_temp', 'updated_at'])
+    updated += len(changed)
+  return updated
+
+def watched_locations(limit, max_age):
+  """
+  Locations with saved queries whose forecast is older than max_age (a timedelta),
+  most-queried first, then least recently refreshed (never-refreshed first).
+  """
+  stale_before = timezone.now() - max_age
+  return (
+    Location.objects
+    .annotate(query_count=Count('queries'))
+    .filter(query_count__gt=0)
+    .filter(Q(forecast_refreshed_at__isnull=True) | Q(forecast_refreshed_at__lt=stale_before))
+    .order_by('-query_count', F('forecast_refreshed_at').asc(nulls_first=True), 'pk')[:limit]
+  )
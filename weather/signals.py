@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.utils import timezone
+from django.dispatch import receiver
+
+from .cache_utils import bump_home_version
+from .models import Location, WeatherQuery, WeatherRecord
+
+
+def invalidate_home():
+  """
+  Drop the cached home pages now, and again once the current transaction
+  commits, in case a reader re-cached the old data in between.
+  Bulk writes (bulk_create, QuerySet.update) send no signals and call this directly.
+  """
+  bump_home_version()
+  transaction.on_commit(bump_home_version)
+
+
+@receiver(pre_delete, sender=WeatherQuery)
+def query_deleting(sender, instance, **kwargs):
+  # its records are detached (source_query=NULL) by an UPDATE that doesn't touch updated_at
+  WeatherRecord.objects.filter(source_query=instance).update(updated_at=timezone.now())
+
+
+@receiver(pre_save, sender=WeatherRecord)
+def remember_record_owner(sender, instance, **kwargs):
+  # the query a record belonged to before this save, which loses it if it moves
+  instance._previous_owner = (
+    WeatherRecord.objects.filter(pk=instance.pk).values_list('source_query_id', flat=True).first()
+    if instance.pk else None
+  )
+
+
+@receiver(post_save, sender=WeatherRecord)
+def record_saved(sender, instance, **kwargs):
+  # single saves (update_record, admin); the bulk paths in services recompute themselves
+  from .services import refresh_best_days
+  refresh_best_days([instance.source_query_id, getattr(instance, '_previous_owner', None)])
+
+
+# Records are only deleted by cascades from their Location, which has its own
+# receiver; not listening for record deletes keeps those cascades fast.
+@receiver(post_save, sender=WeatherRecord)
+@receiver(post_save, sender=WeatherQuery)
+@receiver(post_delete, sender=WeatherQuery)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def home_data_changed(sender, **kwargs):
+  invalidate_home()
@@ -0,0 +1,109 @@
+import hashlib
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+
+LOCK_TIMEOUT = 30  # seconds before an abandoned cross-process lock expires
+LOCK_POLL = 0.05  # seconds between attempts to take a held lock
+
+
+class _Call:
+  __slots__ = ('done', 'result', 'error')
+
+  def __init__(self):
+    self.done = threading.Event()
+    self.result = None
+    self.error = None
+
+
+class SingleFlight:
+  """
+  Coalesces concurrent calls with the same key within this process:
+  the first caller runs the function, the others wait for and share its
+  result (or exception).
+  """
+
+  def __init__(self):
+    self._calls = {}
+    self._lock = threading.Lock()
+    self.leaders = 0
+    self.followers = 0
+
+  def do(self, key, fn, *args, **kwargs):
+    with self._lock:
+      call = self._calls.get(key)
+      leader = call is None
+      if leader:
+        call = self._calls[key] = _Call()
+        self.leaders += 1
+      else:
+        self.followers += 1
+
+    if not leader:
+      call.done.wait()
+      if call.error is not None:
+        raise call.error
+      return call.result
+
+    try:
+      call.result = fn(*args, **kwargs)
+      return call.result
+    except BaseException as e:
+      call.error = e
+      raise
+    finally:
+      with self._lock:
+        del self._calls[key]
+      call.done.set()
+
+  def stats(self):
+    with self._lock:
+      return {'leaders': self.leaders, 'followers': self.followers, 'in_flight': len(self._calls)}
+
+
+def _lock_cache():
+  alias = getattr(settings, 'SINGLE_FLIGHT_CACHE_ALIAS', None)
+  return caches[alias] if alias else None
+
+
+@contextmanager
+def cache_lock(key, timeout=LOCK_TIMEOUT):
+  """
+  Cross-process mutex built on cache.add() in settings.SINGLE_FLIGHT_CACHE_ALIAS.
+  A no-op when no alias is configured. Gives up waiting after `timeout`
+  seconds and proceeds, so a crashed holder can't block callers forever.
+  """
+  cache = _lock_cache()
+  if cache is None:
+    yield
+    return
+
+  lock_key = 'lock:' + hashlib.sha1(key.encode('utf-8')).hexdigest()
+  token = uuid.uuid4().hex
+  deadline = time.monotonic() + timeout
+  while not cache.add(lock_key, token, timeout) and time.monotonic() < deadline:
+    time.sleep(LOCK_POLL)
+  try:
+    yield
+  finally:
+    if cache.get(lock_key) == token:
+      cache.delete(lock_key)
+
+
+def single_flight(key_func):
+  """Decorator: coalesce concurrent calls whose key_func(*args, **kwargs) is equal."""
+  def decorator(fn):
+    flights = SingleFlight()
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+      return flights.do(key_func(*args, **kwargs), fn, *args, **kwargs)
+
+    wrapper.flights = flights
+    return wrapper
+  return decorator
@@ -0,0 +1,112 @@
+import math
+import threading
+from collections import defaultdict
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+CELL_DEGREES = 0.05  # ~5.5 km cells; radius queries only look at the cells they overlap
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+  phi1, phi2 = math.radians(lat1), math.radians(lat2)
+  dphi = phi2 - phi1
+  dlambda = math.radians(lon2 - lon1)
+  a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+  return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+  """Uniform lat/lon grid of (key, lat, lon) points with nearest-within-radius lookup."""
+
+  def __init__(self, cell_degrees=CELL_DEGREES):
+    self.cell_degrees = cell_degrees
+    self._cells = defaultdict(list)
+    self._lon_cells = int(round(360 / cell_degrees))
+    self._size = 0
+    self._dead = set()  # discarded keys, skipped by nearest()
+
+  def __len__(self):
+    return self._size
+
+  def _cell(self, lat, lon):
+    return (int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees)) % self._lon_cells)
+
+  def add(self, key, lat, lon):
+    self._cells[self._cell(lat, lon)].append((key, lat, lon))
+    self._size += 1
+
+  def discard(self, key):
+    if key not in self._dead:
+      self._dead.add(key)
+      self._size -= 1
+
+  def nearest(self, lat, lon, radius_km):
+    """Return (key, distance_km) of the closest point within radius_km, or None."""
+    lat_span = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(min(89.0, abs(lat) + lat_span)))
+    lon_span = min(180.0, radius_km / (KM_PER_DEGREE * cos_lat))
+
+    row_min, col_min = self._cell(lat - lat_span, lon - lon_span)
+    row_max = self._cell(lat + lat_span, lon)[0]
+    cols = min(self._lon_cells, int(math.ceil(2 * lon_span / self.cell_degrees)) + 1)
+
+    best = None
+    for row in range(row_min, row_max + 1):
+      for i in range(cols):
+        for key, p_lat, p_lon in self._cells.get((row, (col_min + i) % self._lon_cells), ()):
+          if key in self._dead:
+            continue
+          d = haversine_km(lat, lon, p_lat, p_lon)
+          if d <= radius_km and (best is None or d < best[1]):
+            best = (key, d)
+    return best
+
+
+class LocationSpatialIndex:
+  """
+  Process-wide GridIndex over Location coordinates, keyed by primary key.
+  Like fuzzy_index.LocationNameIndex, it is built on first use and topped up
+  with newly inserted rows before each lookup; rows found deleted are discarded.
+  """
+
+  def __init__(self):
+    self._grid = GridIndex()
+    self._last_id = 0
+    self._lock = threading.Lock()
+
+  def _catch_up(self):
+    from .models import Location
+    rows = Location.objects.filter(pk__gt=self._last_id).order_by('pk').values_list('pk', 'latitude', 'longitude')
+    for pk, lat, lon in rows.iterator(chunk_size=10000):
+      self._grid.add(pk, lat, lon)
+      self._last_id = pk
+
+  def nearest(self, lat, lon, radius_km):
+    with self._lock:
+      self._catch_up()
+      return self._grid.nearest(lat, lon, radius_km)
+
+  def discard(self, pk):
+    with self._lock:
+      self._grid.discard(pk)
+
+  def reset(self):
+    with self._lock:
+      self._grid = GridIndex()
+      self._last_id = 0
+
+
+location_points = LocationSpatialIndex()
+
+
+def nearest_location(lat, lon, radius_km):
+  """Return the stored Location closest to (lat, lon) within radius_km, or None."""
+  from .models import Location
+  while True:
+    found = location_points.nearest(lat, lon, radius_km)
+    if found is None:
+      return None
+    loc = Location.objects.filter(pk=found[0]).first()
+    if loc:
+      return loc
+    location_points.discard(found[0])  # deleted since it was indexed
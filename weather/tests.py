@@ -1,3 +1,1124 @@
-from django.test import TestCase
+import hashlib
+import importlib.util
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from difflib import get_close_matches
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import address_rules, forecast_agg, http_client, ml_backends, ml_utils, views
+from .cache_utils import LRUCache, cached_response, response_cache_key
+from .fuzzy_index import TrigramIndex, location_names
+from .geocode import get_or_create_location
+from .gazetteer import Gazetteer, build_gazetteer
+from .geocoder import GeocoderBusy, geocode
+from .models import GeocodeResult, Location, RawPayload, WeatherQuery, WeatherRecord
+from .ratelimit import RateLimiter
+from .fetch_weather import OPEN_METEO_ARCHIVE_URL, OPEN_METEO_URL, history_chunks
+from .serializers import WeatherRecordSerializer
+from .services import forecast_day_records, missing_date_ranges, upsert_weather_records, watched_locations
+from .singleflight import SingleFlight, cache_lock
+from .spatial_index import GridIndex, location_points, nearest_location
+from .views import HOME_PAGE_SIZE, build_home_context, process_weather_request
+
+
+def make_location(name='London', lat=51.5, lon=-0.12, country='GB', address_type=''):
+  return Location.objects.create(
+    name=name, display_name=name, latitude=lat, longitude=lon, country=country, address_type=address_type
+  )
+
+
+def make_query(location, temps, start=date(2025, 1, 1)):
+  wq = WeatherQuery.objects.create(
+    location=location,
+    start_date=start,
+    end_date=start + timedelta(days=len(temps) - 1)
+  )
+  for i, temp in enumerate(temps):
+    WeatherRecord.objects.create(
+      location=location,
+      date=start + timedelta(days=i),
+      temp_c=temp,
+      source_query=wq
+    )
+  return wq
+
+
+class HomeContextTests(TestCase):
+  def count_statements(self):
+    with CaptureQueriesContext(connection) as ctx:
+      build_home_context()
+    return len(ctx.captured_queries)
+
+  def test_statement_count_is_constant(self):
+    for i in range(3):
+      make_query(make_location(f'City {i}'), [10.0, 19.0, 30.0])
+    few = self.count_statements()
+
+    for i in range(3, 3 + HOME_PAGE_SIZE * 2):
+      make_query(make_location(f'City {i}'), [10.0, 19.0, 30.0])
+    many = self.count_statements()
+
+    self.assertEqual(few, many)
+
+  def test_best_day_from_stored_summary(self):
+    make_query(make_location(), [5.0, 21.5, 18.0, None])
+    item = build_home_context()['queries_with_best'][0]
+    self.assertEqual(item['best_day'], date(2025, 1, 2))
+    self.assertEqual(item['best_temp'], 21.5)
+    self.assertEqual([r.date for r in item['records']], [date(2025, 1, 1) + timedelta(days=i) for i in range(4)])
+
+  def test_paginates_queries(self):
+    for i in range(HOME_PAGE_SIZE + 1):
+      make_query(make_location(f'City {i}'), [20.0])
+    self.assertEqual(len(build_home_context()['queries_with_best']), HOME_PAGE_SIZE)
+    self.assertEqual(len(build_home_context(2)['queries_with_best']), 1)
+
+
+class HomePageCacheTests(TestCase):
+  def setUp(self):
+    cache.clear()
+
+  def get_home(self, client=None):
+    return (client or self.client).get(reverse('weather:home')).content.decode()
+
+  def test_second_request_is_served_from_cache(self):
+    make_query(make_location(), [5.0, 21.5])
+    self.get_home()
+    with self.assertNumQueries(0):
+      html = self.get_home()
+    self.assertIn('21.5°C', html)
+
+  def test_out_of_range_and_junk_pages_share_the_clamped_pages_entry(self):
+    make_query(make_location(), [5.0])
+    self.get_home()
+    for page in ('999999', 'abc', '-3', '1'):
+      with self.assertNumQueries(0):
+        response = self.client.get(reverse('weather:home'), {'page': page})
+      self.assertEqual(response.status_code, 200)
+
+  def test_writes_invalidate_the_cached_page(self):
+    london = make_location()
+    wq = make_query(london, [5.0, 21.5])
+    self.assertIn('21.5°C', self.get_home())
+
+    rec = WeatherRecord.objects.get(location=london, date=date(2025, 1, 2))
+    self.client.post(reverse('weather:update_record', args=[rec.pk]), {'temp_c': '19.5'})
+    self.assertIn('19.5°C', self.get_home())
+
+    # bulk upserts send no signals and invalidate explicitly
+    upsert_weather_records([WeatherRecord(location=london, date=date(2025, 1, 2), temp_c=20.5, source_query=wq)])
+    self.assertIn('20.5°C', self.get_home())
+
+    self.client.post(reverse('weather:delete_query', args=[wq.pk]))
+    self.assertIn('No saved queries yet.', self.get_home())
+
+  def test_cached_html_carries_each_visitors_own_csrf_token(self):
+    rec = WeatherRecord.objects.get(source_query=make_query(make_location(), [5.0]))
+    self.get_home()
+    for _ in range(2):
+      client = self.client_class(enforce_csrf_checks=True)
+      html = self.get_home(client)
+      self.assertNotIn(views.CSRF_SENTINEL, html)
+      token = html.split('name="csrfmiddlewaretoken" value="')[1].split('"')[0]
+      response = client.post(reverse('weather:update_record', args=[rec.pk]), {'temp_c': '7', 'csrfmiddlewaretoken': token})
+      self.assertEqual(response.status_code, 302)
+
+  def test_fragment_key_only_changes_with_the_query_shown(self):
+    london, paris = make_location('London'), make_location('Paris', 48.85, 2.35)
+    make_query(london, [5.0])
+    make_query(paris, [6.0])
+    before = {i['query'].location.name: i['fragment_key'] for i in build_home_context()['queries_with_best']}
+    rec = WeatherRecord.objects.get(location=london)
+    rec.temp_c = 8.0
+    rec.save()
+    after = {i['query'].location.name: i['fragment_key'] for i in build_home_context()['queries_with_best']}
+    self.assertNotEqual(before['London'], after['London'])
+    self.assertEqual(before['Paris'], after['Paris'])
+
+
+class BestDaySummaryTests(TestCase):
+  def test_upsert_recomputes_queries_that_gain_or_lose_records(self):
+    london = make_location()
+    old = make_query(london, [5.0, 20.5, 30.0])
+    self.assertEqual((old.best_day, old.best_temp), (None, None))  # stale instance
+    old.refresh_from_db()
+    self.assertEqual((old.best_day, old.best_temp), (date(2025, 1, 2), 20.5))
+
+    new = WeatherQuery.objects.create(location=london, start_date=date(2025, 1, 2), end_date=date(2025, 1, 2))
+    upsert_weather_records([WeatherRecord(location=london, date=date(2025, 1, 2), temp_c=19.0, source_query=new)])
+    old.refresh_from_db()
+    new.refresh_from_db()
+    self.assertEqual((old.best_day, old.best_temp), (date(2025, 1, 3), 30.0))
+    self.assertEqual((new.best_day, new.best_temp), (date(2025, 1, 2), 19.0))
+
+  def test_refresh_without_moving_records_updates_the_owner(self):
+    london = make_location()
+    wq = make_query(london, [5.0, 6.0])
+    upsert_weather_records(
+      [WeatherRecord(location=london, date=date(2025, 1, 2), temp_c=21.0)],
+      update_fields=['temp_c', 'temp_f', 'description', 'updated_at']
+    )
+    wq.refresh_from_db()
+    self.assertEqual((wq.best_day, wq.best_temp), (date(2025, 1, 2), 21.0))
+
+  def test_saving_a_moved_record_refreshes_both_owners(self):
+    london = make_location()
+    old = make_query(london, [5.0, 21.0])
+    new = WeatherQuery.objects.create(location=london, start_date=date(2025, 1, 2), end_date=date(2025, 1, 2))
+    rec = WeatherRecord.objects.get(location=london, date=date(2025, 1, 2))
+    rec.source_query = new
+    rec.save()
+    old.refresh_from_db()
+    new.refresh_from_db()
+    self.assertEqual((old.best_day, old.best_temp), (date(2025, 1, 1), 5.0))
+    self.assertEqual((new.best_day, new.best_temp), (date(2025, 1, 2), 21.0))
+
+  def test_update_record_view_updates_best_day(self):
+    wq = make_query(make_location(), [5.0, 6.0])
+    rec = WeatherRecord.objects.get(source_query=wq, date=date(2025, 1, 1))
+    self.client.post(reverse('weather:update_record', args=[rec.pk]), {'temp_c': '19'})
+    wq.refresh_from_db()
+    self.assertEqual((wq.best_day, wq.best_temp), (date(2025, 1, 1), 19.0))
+
+  def test_backfill_command(self):
+    queries = [make_query(make_location(f'City {i}'), [10.0, 18.0 + i]) for i in range(5)]
+    WeatherQuery.objects.update(best_day=None, best_temp=None)
+    out = StringIO()
+    call_command('backfill_best_days', '--batch-size', '2', stdout=out)
+    self.assertIn('updated 5', out.getvalue())
+    self.assertEqual(
+      list(WeatherQuery.objects.order_by('pk').values_list('best_temp', flat=True)),
+      [18.0, 19.0, 20.0, 21.0, 22.0]
+    )
+    self.assertEqual(WeatherQuery.objects.get(pk=queries[4].pk).best_day, date(2025, 1, 2))
+
+  def test_api_sorts_and_filters_by_comfort(self):
+    for i, temp in enumerate([30.0, 19.0, 25.0, None]):
+      make_query(make_location(f'City {i}'), [temp])
+    url = reverse('weather:api-query-list')
+    ordered = self.client.get(url, {'ordering': 'comfort', 'fields': 'best_temp'}).json()['results']
+    self.assertEqual([r['best_temp'] for r in ordered], [19.0, 25.0, 30.0, None])
+    near = self.client.get(url, {'max_comfort_gap': '5', 'fields': 'best_temp'}).json()['results']
+    self.assertEqual(sorted(r['best_temp'] for r in near), [19.0, 25.0])
+    self.assertEqual(self.client.get(url, {'max_comfort_gap': 'warm'}).status_code, 400)
+
+
+class ResponseCacheTests(TestCase):
+  def setUp(self):
+    cache.clear()
+
+  def test_key_ignores_api_key_and_normalizes_location(self):
+    self.assertEqual(
+      response_cache_key('current', {'q': ' New  York', 'appid': 'a', 'units': 'metric'}),
+      response_cache_key('current', {'q': 'new york', 'appid': 'b', 'units': 'metric'})
+    )
+    self.assertEqual(
+      response_cache_key('forecast', {'lat': 51.5012, 'lon': -0.1201}),
+      response_cache_key('forecast', {'lat': 51.4998, 'lon': -0.1204})
+    )
+    self.assertNotEqual(
+      response_cache_key('current', {'q': 'paris'}),
+      response_cache_key('forecast', {'q': 'paris'})
+    )
+
+  def test_second_lookup_is_served_from_cache(self):
+    calls = []
+    def loader():
+      calls.append(1)
+      return {'name': 'Paris'}
+
+    params = {'q': 'Paris', 'units': 'metric'}
+    self.assertEqual(cached_response('current', params, loader), {'name': 'Paris'})
+    self.assertEqual(cached_response('current', params, loader), {'name': 'Paris'})
+    self.assertEqual(len(calls), 1)
+
+  def test_lru_evicts_least_recently_used(self):
+    lru = LRUCache(maxsize=2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    lru.get('a')
+    lru.set('c', 3)
+    self.assertIsNone(lru.get('b'))
+    self.assertEqual(lru.get('a'), 1)
+    self.assertEqual(lru.stats()['evictions'], 1)
+
+
+CURRENT_JSON = {
+  'name': 'Paris',
+  'sys': {'country': 'FR', 'sunrise': 0, 'sunset': 0},
+  'main': {'temp': 20.0, 'feels_like': 20.0, 'humidity': 50},
+  'weather': [{'description': 'clear sky', 'icon': '01d'}],
+  'wind': {'speed': 1.0},
+  'visibility': 10000,
+}
+
+
+class ProcessWeatherRequestTests(TestCase):
+  def test_current_and_forecast_are_fetched_concurrently(self):
+    def slow_fetch(kind, params):
+      time.sleep(0.3)
+      return CURRENT_JSON if kind == 'current' else {'list': []}
+
+    with mock.patch('weather.fetch_weather.fetch_openweather', side_effect=slow_fetch):
+      started = time.monotonic()
+      result = process_weather_request('Paris', 'City')
+      elapsed = time.monotonic() - started
+
+    self.assertTrue(result['success'])
+    self.assertEqual(result['data']['location'], 'Paris')
+    self.assertLess(elapsed, 0.55)
+
+
+class HttpClientTests(TestCase):
+  def test_provider_session_is_shared_and_latency_recorded(self):
+    session = http_client.get_session('openweather')
+    self.assertIs(session, http_client.get_session('openweather'))
+    before = http_client.latency_stats().get('openweather', {}).get('requests', 0)
+
+    with mock.patch.object(session, 'get', return_value=mock.Mock(status_code=200)) as get:
+      http_client.get('openweather', 'https://example.com')
+
+    self.assertEqual(get.call_args.kwargs['timeout'], http_client.provider_timeout('openweather'))
+    self.assertEqual(http_client.latency_stats()['openweather']['requests'], before + 1)
+
+
+class ClassifierTests(TestCase):
+  def test_views_import_does_not_load_torch(self):
+    script = (
+      "import os, sys, django;"
+      "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weather_app.settings');"
+      "django.setup(); import weather.views;"
+      "print('torch' in sys.modules)"
+    )
+    out = subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True)
+    self.assertEqual(out.stdout.strip(), 'False')
+
+  def test_concurrent_requests_are_batched(self):
+    batches = []
+    def predict(addresses):
+      batches.append(list(addresses))
+      return [a.upper() for a in addresses]
+
+    batcher = ml_utils.BatchingClassifier(predict, max_batch_size=8, max_wait=0.05)
+    futures = [batcher.submit(a) for a in ['a', 'b', 'c']]
+
+    self.assertEqual([f.result(timeout=1) for f in futures], ['A', 'B', 'C'])
+    self.assertEqual(batches, [['a', 'b', 'c']])
+    self.assertEqual(batcher.stats()['batch_size']['count'], 1)
+
+  def test_short_prediction_fails_the_whole_batch(self):
+    batcher = ml_utils.BatchingClassifier(lambda addresses: ['City'], max_batch_size=8, max_wait=0.05)
+    futures = [batcher.submit(a) for a in ['a', 'b']]
+    for future in futures:
+      with self.assertRaises(RuntimeError):
+        future.result(timeout=1)
+
+  def test_classify_address_gives_up_after_the_timeout(self):
+    with mock.patch.object(ml_utils, '_batcher', ml_utils.BatchingClassifier(lambda a: time.sleep(1) or a)):
+      with self.assertRaises(FuturesTimeoutError):
+        ml_utils.classify_address('London', timeout=0.05)
+
+  def test_get_weather_reports_classifier_failures(self):
+    url = reverse('weather:get_weather')
+    for error in (FuturesTimeoutError(), RuntimeError('Classifier returned 1 results for 2 addresses')):
+      with mock.patch.object(views, 'classify_address_type', side_effect=error), redirect_stdout(StringIO()):
+        response = self.client.post(url, json.dumps({'location': 'big ben'}), content_type='application/json')
+      self.assertEqual(response.status_code, 503)
+      self.assertFalse(response.json()['success'])
+
+
+def make_tiny_classifier(directory):
+  """Save a randomly initialised one-layer classifier with the real tokenizer (the weights aren't in git)."""
+  import torch
+  from transformers import RobertaConfig, RobertaForSequenceClassification
+  for name in ('config.json', 'merges.txt', 'vocab.json', 'tokenizer.json', 'tokenizer_config.json', 'special_tokens_map.json'):
+    shutil.copy(Path(ml_utils.model_path) / name, directory)
+  config = RobertaConfig.from_pretrained(directory)
+  config.update({'hidden_size': 16, 'num_hidden_layers': 1, 'num_attention_heads': 2, 'intermediate_size': 32})
+  torch.manual_seed(0)
+  RobertaForSequenceClassification(config).save_pretrained(directory)
+
+
+@skipUnless(importlib.util.find_spec('torch') and importlib.util.find_spec('onnxruntime'), 'needs torch and onnxruntime')
+class ClassifierBackendTests(TestCase):
+  addresses = ['London', '48.85, 2.35', 'Big Ben', '70123']
+
+  def setUp(self):
+    tmp = tempfile.TemporaryDirectory()
+    self.addCleanup(tmp.cleanup)
+    self.model_dir = Path(tmp.name) / 'model'
+    self.artifact_dir = Path(tmp.name) / 'artifacts'
+    self.model_dir.mkdir()
+    make_tiny_classifier(self.model_dir)
+    self.enterContext(mock.patch.object(ml_utils, 'model_path', str(self.model_dir)))
+    self.enterContext(mock.patch('weather.management.commands.export_classifier.model_path', str(self.model_dir)))
+    self.enterContext(warnings.catch_warnings())
+    warnings.simplefilter('ignore')  # torch export / quantization deprecation noise
+
+  def load(self, backend):
+    with override_settings(ADDRESS_CLASSIFIER_BACKEND=backend, ADDRESS_CLASSIFIER_ARTIFACT_DIR=str(self.artifact_dir)), \
+         mock.patch.object(ml_utils, '_classifier', None):
+      return ml_utils.load_classifier()
+
+  def test_exported_artifacts_load_from_the_artifact_dir(self):
+    expected = self.load('torch')(self.addresses)
+    for backend in ('quantized', 'onnx'):
+      with self.assertRaises(FileNotFoundError):
+        self.load(backend)
+      call_command('export_classifier', '--format', backend, '--output', str(self.artifact_dir), stdout=StringIO())
+    for name in (ml_backends.QUANTIZED_FILE, ml_backends.ONNX_FILE):
+      self.assertTrue((self.artifact_dir / name).exists())
+      self.assertFalse((self.model_dir / name).exists())
+
+    self.assertEqual(self.load('onnx')(self.addresses), expected)
+    # int8 weights may flip a near-tie on random weights, so only the shape is compared
+    quantized = self.load('quantized')(self.addresses)
+    self.assertEqual(len(quantized), len(self.addresses))
+    self.assertTrue(set(quantized) <= set(ml_utils.id2label))
+
+
+class AddressRulesTests(TestCase):
+  def test_obvious_inputs_skip_the_classifier(self):
+    make_location('Paris', 48.85, 2.35, country='France', address_type='City')
+    cases = {
+      '48.85, 2.35': 'GPS Coordinates',
+      '70123': 'Zip Code',
+      '10001-1234': 'Zip Code',
+      'Sw1A 1Aa': 'Zip Code',
+      'K1A 0B1,ca': 'Zip Code',
+      'paris': 'City',
+      'France': 'Country',
+    }
+    with mock.patch.object(ml_utils, 'classify_address') as model:
+      for text, expected in cases.items():
+        self.assertEqual(ml_utils.classify_address_type(text), expected, text)
+    model.assert_not_called()
+
+  def test_ambiguous_input_uses_the_classifier(self):
+    with mock.patch.object(ml_utils, 'classify_address', return_value='Landmarks') as model:
+      self.assertEqual(ml_utils.classify_address_type('Eiffel Tower'), 'Landmarks')
+    model.assert_called_once_with('Eiffel Tower')
+    self.assertGreater(address_rules.fast_path_stats()['classifier'], 0)
+
+  def test_stored_landmark_is_not_sent_to_openweather_by_name(self):
+    location_names.reset()
+    with mock.patch.object(http_client, 'get', return_value=nominatim_response([BIG_BEN])):
+      saved = get_or_create_location('Big Ben')  # as create_query stores it
+    self.assertEqual(saved.address_type, '')
+    self.assertIsNone(address_rules.known_location_type('Big Ben'))
+
+    with mock.patch.object(ml_utils, 'classify_address_cached', return_value='Landmarks') as model, \
+         mock.patch('weather.fetch_weather.fetch_openweather', return_value=CURRENT_JSON) as fetch:
+      response = self.client.post(
+        reverse('weather:get_weather'), json.dumps({'location': 'big ben'}), content_type='application/json'
+      )
+    self.assertTrue(response.json()['success'])
+    model.assert_called_once_with('Big Ben')
+    params = fetch.call_args.args[1]
+    self.assertNotIn('q', params)
+    self.assertEqual((params['lat'], params['lon']), (saved.latitude, saved.longitude))
+
+  def test_geocoded_cities_and_countries_are_remembered(self):
+    responses = [
+      nominatim_response([{'lat': '48.85', 'lon': '2.35', 'display_name': 'Paris, France',
+                           'address': {'city': 'Paris', 'country': 'France'}}]),
+      nominatim_response([{'lat': '46.6', 'lon': '1.9', 'display_name': 'France',
+                           'address': {'country': 'France'}}]),
+    ]
+    with mock.patch.object(http_client, 'get', side_effect=responses):
+      self.assertEqual(get_or_create_location('paris').address_type, 'City')
+      self.assertEqual(get_or_create_location('France').address_type, 'Country')
+    self.assertEqual(address_rules.known_location_type('PARIS'), 'City')
+    self.assertEqual(address_rules.known_location_type('france'), 'Country')
+
+  def test_model_predictions_are_memoized(self):
+    with mock.patch.object(ml_utils, 'classify_address', return_value='Landmarks') as model:
+      ml_utils.classify_address_type('Big  Ben')
+      ml_utils.classify_address_type('big ben')
+    model.assert_called_once()
+
+
+class FuzzyIndexTests(TestCase):
+  def setUp(self):
+    location_names.reset()
+
+  def test_index_matches_difflib(self):
+    names = ['London', 'Londonderry', 'Paris', 'Parma', 'New York', 'Newark']
+    index = TrigramIndex()
+    for name in names:
+      index.add(name)
+    for query in ['Londn', 'Pariss', 'new yrok', 'Newrk', 'Tokyo']:
+      expected = get_close_matches(query.lower(), [n.lower() for n in names], n=1, cutoff=0.75)
+      found = index.search(query)
+      self.assertEqual(found.lower() if found else None, expected[0] if expected else None, query)
+
+  def test_get_or_create_location_uses_fuzzy_index(self):
+    london = make_location('London')
+    with mock.patch.object(http_client, 'get') as upstream:
+      self.assertEqual(get_or_create_location('Londn'), london)
+      # rows added after the index was built are picked up too
+      paris = make_location('Paris', 48.85, 2.35, country='FR')
+      self.assertEqual(get_or_create_location('Pariss'), paris)
+    upstream.assert_not_called()
+
+  def test_deleted_names_are_skipped(self):
+    springfield = make_location('Springfield')
+    self.assertEqual(location_names.search('Springfeld'), 'Springfield')
+    springfield.delete()
+    springfields = make_location('Springfields')
+    # the deleted name is still indexed and the closer match, but only the live one may be returned
+    self.assertEqual(location_names.search('Springfeld'), 'Springfields')
+    springfields.delete()
+    self.assertIsNone(location_names.search('Springfeld'))
+
+  def test_discarded_names_can_come_back(self):
+    index = TrigramIndex()
+    index.add('Paris')
+    index.discard('Paris')
+    self.assertEqual((len(index), index.search('Pariss')), (0, None))
+    index.add('Paris')
+    self.assertEqual(index.search('Pariss'), 'Paris')
+
+
+def nominatim_response(results, status=200):
+  response = mock.Mock(status_code=status)
+  response.json.return_value = results
+  if status >= 400:
+    response.raise_for_status.side_effect = requests.HTTPError(response=response)
+  return response
+
+
+BIG_BEN = {
+  'lat': '51.5007', 'lon': '-0.1246', 'display_name': 'Big Ben, Westminster, London',
+  'address': {'city': 'London', 'country': 'United Kingdom'},
+}
+
+
+class GeocoderTests(TestCase):
+  def setUp(self):
+    location_names.reset()
+
+  def test_results_are_cached_by_normalized_query(self):
+    with mock.patch.object(http_client, 'get', return_value=nominatim_response([BIG_BEN])) as upstream:
+      first = geocode('Big Ben')
+      self.assertEqual(geocode('  big   BEN '), first)
+    upstream.assert_called_once()
+    self.assertEqual((first['lat'], first['city'], first['country']), (51.5007, 'London', 'United Kingdom'))
+    self.assertTrue(GeocodeResult.objects.get(query='big ben').found)
+
+  def test_not_found_is_cached_until_it_expires(self):
+    with mock.patch.object(http_client, 'get', return_value=nominatim_response([])) as upstream:
+      with self.assertRaises(ValueError):
+        get_or_create_location('Atlantis')
+      self.assertIsNone(views.geocode_landmark_nominatim('atlantis'))
+      self.assertEqual(upstream.call_count, 1)
+
+      row = GeocodeResult.objects.get(query='atlantis')
+      self.assertFalse(row.found)
+      self.assertLess(row.expires_at, timezone.now() + timedelta(days=2))
+      GeocodeResult.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+      self.assertIsNone(geocode('Atlantis'))
+      self.assertEqual(upstream.call_count, 2)
+
+  def test_upstream_errors_are_not_cached(self):
+    with mock.patch.object(http_client, 'get', return_value=nominatim_response([], status=503)):
+      with self.assertRaises(requests.HTTPError):
+        geocode('Big Ben')
+    self.assertFalse(GeocodeResult.objects.exists())
+
+  @override_settings(GEOCODER_QUEUE_TIMEOUT=0)
+  def test_gives_up_when_no_request_slot_frees_up(self):
+    with mock.patch('weather.geocoder._limiter', RateLimiter(rate=0.01)) as limiter, \
+         mock.patch.object(http_client, 'get') as upstream:
+      limiter.acquire()
+      with self.assertRaises(GeocoderBusy):
+        geocode('Big Ben')
+    upstream.assert_not_called()
+
+  def test_new_location_is_built_from_the_cached_place(self):
+    with mock.patch.object(http_client, 'get', return_value=nominatim_response([BIG_BEN])) as upstream:
+      self.assertEqual(views.geocode_landmark_nominatim('Big Ben')['city'], 'London')
+      loc = get_or_create_location('Big Ben')
+    upstream.assert_called_once()
+    self.assertEqual((loc.name, loc.latitude, loc.country), ('Big Ben', 51.5007, 'United Kingdom'))
+
+
+class GazetteerTests(TestCase):
+  @classmethod
+  def setUpClass(cls):
+    super().setUpClass()
+    cls.tmp = tempfile.TemporaryDirectory()
+    cls.path = str(Path(cls.tmp.name) / 'gazetteer.sqlite3')
+    build_gazetteer(
+      cls.path, TESTDATA / 'geonames_cities.tsv',
+      postcodes=TESTDATA / 'geonames_postcodes.tsv', countries=TESTDATA / 'geonames_countries.txt',
+      alternate_names=True,
+    )
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.tmp.cleanup()
+    super().tearDownClass()
+
+  def test_places_postcodes_and_countries(self):
+    g = Gazetteer(self.path)
+    self.assertEqual(g.lookup('london')['display_name'], 'London, United Kingdom')  # most populous London
+    self.assertEqual(g.lookup('London, CA')['lat'], 42.98339)
+    self.assertEqual(g.lookup('Munich')['city'], 'München')  # alternate name
+    self.assertEqual(g.lookup('10115')['country'], 'Germany')
+    self.assertEqual(g.lookup('10115,US')['city'], 'New York')
+    france = g.lookup('France')
+    self.assertEqual((france['city'], france['lat']), ('Paris', 48.85341))
+    self.assertIsNone(g.lookup('Big Ben'))
+    self.assertIsNone(g.lookup('Atlantis'))
+
+  def test_build_command_skips_non_places_and_small_ones(self):
+    out = StringIO()
+    path = str(Path(self.tmp.name) / 'small.sqlite3')
+    call_command('build_gazetteer', str(TESTDATA / 'geonames_cities.tsv'), '--output', path,
+                 '--min-population', '1000000', stdout=out)
+    self.assertIn('5 places', out.getvalue())  # London, Paris, Berlin, München + its ASCII name
+    g = Gazetteer(path)
+    self.assertIsNotNone(g.lookup('Berlin'))
+    self.assertIsNone(g.lookup('Paris, US'))
+    self.assertEqual(g.lookup('Berlin')['country'], 'DE')  # no countryInfo: codes only
+
+  def test_failed_build_leaves_no_partial_file(self):
+    path = Path(self.tmp.name) / 'broken.sqlite3'
+    with self.assertRaises(FileNotFoundError):
+      build_gazetteer(str(path), TESTDATA / 'missing.tsv')
+    self.assertEqual(list(Path(self.tmp.name).glob('broken.sqlite3*')), [])
+
+  def test_open_gazetteer_sees_a_rebuilt_file(self):
+    path = str(Path(self.tmp.name) / 'rebuilt.sqlite3')
+    build_gazetteer(path, TESTDATA / 'geonames_cities.tsv')
+    g = Gazetteer(path)
+    g.recheck_interval = 0
+    self.assertIsNotNone(g.lookup('Berlin'))
+    build_gazetteer(path, TESTDATA / 'geonames_cities.tsv', min_population=5000000)
+    self.assertIsNone(g.lookup('Berlin'))
+    self.assertIsNotNone(g.lookup('London'))
+
+  def test_geocoder_uses_gazetteer_and_falls_back_to_nominatim(self):
+    with override_settings(GAZETTEER_PATH=self.path), \
+         mock.patch.object(http_client, 'get', return_value=nominatim_response([BIG_BEN])) as upstream:
+      self.assertEqual(geocode('Berlin')['lat'], 52.52437)
+      loc = get_or_create_location('Paris, FR')
+      upstream.assert_not_called()
+      self.assertEqual(geocode('Big Ben')['city'], 'London')
+      upstream.assert_called_once()
+    self.assertEqual((loc.display_name, loc.country), ('Paris, France', 'France'))
+    self.assertFalse(GeocodeResult.objects.filter(query='berlin').exists())
+
+
+class SpatialIndexTests(TestCase):
+  def setUp(self):
+    location_points.reset()
+
+  def test_grid_finds_nearest_within_radius(self):
+    grid = GridIndex()
+    grid.add('a', 51.5007, -0.1246)
+    grid.add('b', 51.5033, -0.1195)
+    grid.add('fiji', -17.0, 179.999)
+    self.assertEqual(grid.nearest(51.5034, -0.1196, 0.5)[0], 'b')
+    self.assertIsNone(grid.nearest(52.0, 0.0, 0.5))
+    # across the antimeridian
+    self.assertEqual(grid.nearest(-17.0, -179.999, 1.0)[0], 'fiji')
+    grid.discard('b')
+    self.assertEqual(grid.nearest(51.5034, -0.1196, 0.5)[0], 'a')
+
+  def test_deleted_locations_are_skipped(self):
+    far = make_location('Westminster', 51.5007, -0.1246)
+    near = make_location('Parliament', 51.4995, -0.1248)
+    self.assertEqual(nearest_location(51.4995, -0.1248, 1.0), near)
+    near.delete()
+    self.assertEqual(nearest_location(51.4995, -0.1248, 1.0), far)
+    far.delete()
+    self.assertIsNone(nearest_location(51.4995, -0.1248, 1.0))
+
+  def test_gps_lookup_reuses_nearby_location(self):
+    loc = make_location('Westminster', 51.5007, -0.1246)
+    with mock.patch('weather.fetch_weather.fetch_openweather', return_value=CURRENT_JSON) as fetch:
+      process_weather_request('51.5010, -0.1240', 'GPS Coordinates')
+    params = fetch.call_args.args[1]
+    self.assertEqual((params['lat'], params['lon']), (loc.latitude, loc.longitude))
+
+  def test_landmark_lookup_reuses_stored_and_nearby_locations(self):
+    big_ben = make_location('Big Ben', 51.5007, -0.1246, country='United Kingdom')
+    westminster = make_location('Westminster Abbey', 51.4993, -0.1273, country='United Kingdom')
+    abbey = {**BIG_BEN, 'lat': '51.4994', 'lon': '-0.1272', 'display_name': 'Westminster Abbey, London'}
+    with mock.patch.object(http_client, 'get', return_value=nominatim_response([abbey])) as nominatim, \
+         mock.patch('weather.fetch_weather.fetch_openweather', return_value=CURRENT_JSON) as fetch:
+      self.assertTrue(process_weather_request('Big Ben', 'Landmarks')['success'])
+      nominatim.assert_not_called()  # stored by name
+      params = fetch.call_args.args[1]
+      self.assertEqual((params['lat'], params['lon']), (big_ben.latitude, big_ben.longitude))
+
+      # geocoded, then snapped to the stored place a few metres away
+      self.assertTrue(process_weather_request('The Abbey', 'Landmarks')['success'])
+      nominatim.assert_called_once()
+      params = fetch.call_args.args[1]
+      self.assertEqual((params['lat'], params['lon']), (westminster.latitude, westminster.longitude))
+
+
+class SingleFlightTests(TestCase):
+  def test_concurrent_callers_share_one_call(self):
+    flights = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def slow():
+      calls.append(1)
+      release.wait(1)
+      return 'result'
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+      futures = [pool.submit(flights.do, 'paris', slow) for _ in range(5)]
+      time.sleep(0.1)
+      release.set()
+      results = [f.result(timeout=1) for f in futures]
+
+    self.assertEqual(results, ['result'] * 5)
+    self.assertEqual(len(calls), 1)
+    self.assertEqual(flights.stats()['followers'], 4)
+
+  def test_errors_are_shared_and_not_remembered(self):
+    flights = SingleFlight()
+    with self.assertRaises(ValueError):
+      flights.do('k', mock.Mock(side_effect=ValueError))
+    self.assertEqual(flights.do('k', lambda: 1), 1)
+
+  @override_settings(SINGLE_FLIGHT_CACHE_ALIAS='default')
+  def test_cache_lock_excludes_other_holders(self):
+    with cache_lock('location:paris'):
+      self.assertFalse(cache.add('lock:' + hashlib.sha1(b'location:paris').hexdigest(), 'other'))
+    self.assertTrue(cache.add('lock:' + hashlib.sha1(b'location:paris').hexdigest(), 'other'))
+
+
+class UpsertWeatherRecordsTests(TestCase):
+  def days(self, n, temp):
+    return [{'date': (date(2025, 1, 1) + timedelta(days=i)).isoformat(), 'temperature': temp, 'description': 'rain'}
+            for i in range(n)]
+
+  def test_statement_count_does_not_grow_with_days(self):
+    loc = make_location()
+    with CaptureQueriesContext(connection) as few:
+      upsert_weather_records(forecast_day_records(loc, self.days(2, 10.0)))
+    with CaptureQueriesContext(connection) as many:
+      upsert_weather_records(forecast_day_records(loc, self.days(30, 12.0)))
+    self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+
+  def test_existing_rows_are_updated(self):
+    loc = make_location()
+    wq = make_query(loc, [5.0])
+    upsert_weather_records(forecast_day_records(loc, self.days(2, 21.0), source_query=wq))
+    rows = list(WeatherRecord.objects.filter(location=loc).order_by('date').values_list('temp_c', 'temp_f', 'source_query'))
+    self.assertEqual(rows, [(21.0, 69.8, wq.pk), (21.0, 69.8, wq.pk)])
+
+
+def make_forecast_json(days=3, temp=20.0, tz=0):
+  """OpenWeatherMap 5-day/3-hour forecast shape, starting at tomorrow 00:00 in a city tz seconds east of UTC."""
+  city_today = (timezone.now() + timedelta(seconds=tz)).date()
+  tomorrow = datetime.combine(city_today + timedelta(days=1), datetime.min.time(), tzinfo=dt_timezone.utc)
+  slots = []
+  for i in range(days * 8):
+    slots.append({
+      'dt': int((tomorrow + timedelta(hours=3 * i)).timestamp()) - tz,
+      'main': {'temp': temp + i % 8, 'feels_like': temp, 'humidity': 40},
+      'weather': [{'description': 'clear sky' if i % 3 else 'few clouds', 'icon': '01d'}],
+      'wind': {'speed': 2.0},
+      'visibility': 10000,
+      'pop': 0.1,
+    })
+  return {'list': slots, 'city': {'timezone': tz}}
+
+
+class BatchCreateQueriesTests(TestCase):
+  def post(self, items):
+    return self.client.post(reverse('weather:create_queries_batch'), json.dumps({'items': items}), content_type='application/json')
+
+  def test_batch_returns_per_item_results_and_writes_in_bulk(self):
+    london = make_location('London')
+    paris = make_location('Paris', 48.85, 2.35, country='FR')
+    start = date.today() + timedelta(days=1)
+    items = [
+      {'location': 'London', 'start_date': start.isoformat(), 'end_date': (start + timedelta(days=1)).isoformat()},
+      {'location': 'Paris', 'start_date': start.isoformat(), 'end_date': start.isoformat()},
+      {'location': '', 'start_date': start.isoformat(), 'end_date': start.isoformat()},
+      {'location': 'Nowhere', 'start_date': start.isoformat(), 'end_date': start.isoformat()},
+    ]
+
+    def resolve(text):
+      if text == 'Nowhere':
+        raise ValueError('Location not found')
+      return {'London': london, 'Paris': paris}[text]
+
+    with mock.patch('weather.views.get_or_create_location', side_effect=resolve), \
+         mock.patch('weather.views.fetch_openweather_forecast', return_value=make_forecast_json()):
+      response = self.post(items)
+
+    results = response.json()['results']
+    self.assertEqual([r['success'] for r in results], [True, True, False, False])
+    self.assertEqual(results[0]['days'], 2)
+    self.assertEqual(results[2]['error'], 'Location is required.')
+    self.assertIn('Location error', results[3]['error'])
+    self.assertEqual(WeatherQuery.objects.count(), 2)
+    self.assertEqual(WeatherRecord.objects.filter(location=london).count(), 2)
+
+  def test_overlapping_items_report_the_records_they_keep(self):
+    london = make_location('London')
+    start = date.today() + timedelta(days=1)
+    items = [
+      {'location': 'London', 'start_date': start.isoformat(), 'end_date': (start + timedelta(days=1)).isoformat()},
+      {'location': 'London', 'start_date': (start + timedelta(days=1)).isoformat(), 'end_date': (start + timedelta(days=1)).isoformat()},
+    ]
+    with mock.patch('weather.views.get_or_create_location', return_value=london), \
+         mock.patch('weather.views.fetch_openweather_forecast', return_value=make_forecast_json()):
+      results = self.post(items).json()['results']
+    self.assertEqual([r['days'] for r in results], [1, 1])
+    self.assertEqual(WeatherRecord.objects.filter(location=london).count(), 2)
+
+  def test_rejects_non_list_items(self):
+    self.assertEqual(self.post({'location': 'London'}).status_code, 400)
+
+
+def fake_open_meteo(lat, lon, start_date, end_date, url=OPEN_METEO_URL):
+  days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+  return {'daily': {
+    'time': [d.isoformat() for d in days],
+    'temperature_2m_min': [10.0] * len(days),
+    'temperature_2m_max': [20.0] * len(days),
+    'weathercode': [3] * len(days),
+  }}
+
+
+class HistoryIngestionTests(TestCase):
+  def test_chunks_split_long_ranges_and_use_archive_for_older_days(self):
+    today = date(2025, 8, 19)
+    chunks = history_chunks([(date(2023, 1, 1), date(2025, 8, 18))], today=today)
+    self.assertEqual(chunks[0], (OPEN_METEO_ARCHIVE_URL, date(2023, 1, 1), date(2024, 1, 1)))
+    self.assertEqual(chunks[-2][0], OPEN_METEO_ARCHIVE_URL)
+    self.assertEqual(chunks[-2][2], date(2025, 8, 13))
+    self.assertEqual(chunks[-1], (OPEN_METEO_URL, date(2025, 8, 14), date(2025, 8, 18)))
+    self.assertTrue(all((end - start).days < 366 for _, start, end in chunks))
+
+  def test_missing_date_ranges(self):
+    london = make_location('London')
+    WeatherRecord.objects.create(location=london, date=date(2024, 1, 3), observed=True)
+    WeatherRecord.objects.create(location=london, date=date(2024, 1, 4), observed=True)
+    WeatherRecord.objects.create(location=london, date=date(2024, 1, 6))  # a forecast, not history
+    self.assertEqual(missing_date_ranges(london, date(2024, 1, 1), date(2024, 1, 8)), [
+      (date(2024, 1, 1), date(2024, 1, 2)),
+      (date(2024, 1, 5), date(2024, 1, 8)),
+    ])
+
+  def test_long_past_range_is_fetched_once_then_only_the_gaps(self):
+    london = make_location('London')
+    url = reverse('weather:create_query')
+    with mock.patch('weather.fetch_weather.fetch_weather_for_range', side_effect=fake_open_meteo) as fetch:
+      response = self.client.post(url, {'location': 'London', 'start_date': '2023-01-01', 'end_date': '2023-12-31'})
+      self.assertEqual(response.status_code, 302)
+      self.assertEqual(fetch.call_count, 1)
+      self.assertEqual(WeatherRecord.objects.filter(location=london, observed=True).count(), 365)
+
+      fetch.reset_mock()
+      self.client.post(url, {'location': 'London', 'start_date': '2022-12-01', 'end_date': '2024-01-10'})
+      requested = sorted((c.args[2], c.args[3]) for c in fetch.call_args_list)
+      self.assertEqual(requested, [(date(2022, 12, 1), date(2022, 12, 31)), (date(2024, 1, 1), date(2024, 1, 10))])
+
+    latest = WeatherQuery.objects.latest('pk')
+    self.assertEqual(WeatherRecord.objects.filter(source_query=latest).count(), 406)
+    self.assertEqual(WeatherRecord.objects.get(location=london, date=date(2023, 6, 1)).description, 'overcast')
+    self.assertIsNone(latest.raw_payload)
+
+  def test_forecast_part_is_still_limited_to_max_days(self):
+    self.assertIsNone(views.validate_query_input('London', date(2020, 1, 1), date(2022, 1, 1)))
+    start = date.today() + timedelta(days=1)
+    self.assertIn('Maximum', views.validate_query_input('London', start, start + timedelta(days=views.MAX_DAYS)))
+    self.assertIn('1940', views.validate_query_input('London', date(1939, 1, 1), date(1939, 1, 2)))
+
+
+class ExportRecordsTests(TestCase):
+  def export(self, **params):
+    response = self.client.get(reverse('weather:export_records'), params)
+    return response, b''.join(response.streaming_content).decode()
+
+  def test_csv_and_ndjson_for_a_location_and_date_range(self):
+    london = make_location('London')
+    make_query(london, [5.0, 6.0, 7.0], start=date(2025, 1, 1))
+    make_query(make_location('Paris', 48.85, 2.35, country='FR'), [9.0], start=date(2025, 1, 1))
+
+    response, body = self.export(location='london', start_date='2025-01-02')
+    self.assertEqual(response['Content-Type'], 'text/csv')
+    lines = body.splitlines()
+    self.assertEqual(lines[0], ','.join(views.EXPORT_FIELDS))
+    self.assertEqual([line.split(',')[2] for line in lines[1:]], ['2025-01-02', '2025-01-03'])
+
+    _, body = self.export(format='ndjson', location=str(london.pk), end_date='2025-01-01')
+    rows = [json.loads(line) for line in body.splitlines()]
+    self.assertEqual(len(rows), 1)
+    self.assertEqual((rows[0]['date'], rows[0]['temp_c'], rows[0]['location']), ('2025-01-01', 5.0, london.pk))
+    # the same columns the API serializer emits
+    self.assertCountEqual(rows[0], list(WeatherRecordSerializer(WeatherRecord.objects.first()).data))
+
+  def test_rejects_bad_parameters(self):
+    self.assertEqual(self.client.get(reverse('weather:export_records'), {'format': 'xml'}).status_code, 400)
+    self.assertEqual(self.client.get(reverse('weather:export_records'), {'start_date': '2025-13-01'}).status_code, 400)
+
+  def test_memory_stays_flat_as_the_export_grows(self):
+    locations = [make_location(f'Town {i}', i, i) for i in range(8)]
+    start = date(2000, 1, 1)
+    WeatherRecord.objects.bulk_create(
+      [WeatherRecord(location=loc, date=start + timedelta(days=d), temp_c=10.0, description='overcast')
+       for loc in locations for d in range(5000)],
+      batch_size=5000
+    )
+
+    def peak_while_streaming(**params):
+      response = self.client.get(reverse('weather:export_records'), params)
+      tracemalloc.start()
+      size = sum(len(chunk) for chunk in response.streaming_content)
+      _, peak = tracemalloc.get_traced_memory()
+      tracemalloc.stop()
+      return size, peak
+
+    small_size, small_peak = peak_while_streaming(location=str(locations[0].pk))
+    big_size, big_peak = peak_while_streaming()
+    self.assertGreater(big_size, 7 * small_size)
+    # a materialized export would grow with the row count; a streamed one doesn't
+    self.assertLess(big_peak, 2 * small_peak)
+    self.assertLess(big_peak, big_size / 2)
+
+
+class ReadApiTests(TestCase):
+  def test_query_list_is_paginated_with_constant_statements(self):
+    for i in range(3):
+      make_query(make_location(f'City {i}'), [10.0, 20.0])
+    url = reverse('weather:api-query-list')
+    with CaptureQueriesContext(connection) as few:
+      self.client.get(url, {'fields': 'id,location,records'})
+    for i in range(3, 60):
+      make_query(make_location(f'City {i}'), [10.0, 20.0])
+    with CaptureQueriesContext(connection) as many:
+      body = self.client.get(url, {'fields': 'id,location,records'}).json()
+    self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+    self.assertEqual(body['count'], 60)
+    self.assertEqual(len(body['results']), 50)
+    self.assertEqual(set(body['results'][0]), {'id', 'location', 'records'})
+    self.assertEqual(len(body['results'][0]['records']), 2)
+
+  def test_raw_response_is_opt_in(self):
+    wq = make_query(make_location(), [10.0])
+    wq.raw_payload = RawPayload.store({'list': []})
+    wq.save()
+    url = reverse('weather:api-query-detail', args=[wq.pk])
+    default = self.client.get(url).json()
+    self.assertNotIn('raw_response', default)
+    self.assertNotIn('records', default)
+    self.assertEqual(default['location']['name'], 'London')
+    self.assertEqual(self.client.get(url, {'fields': 'id,raw_response'}).json(), {'id': wq.pk, 'raw_response': {'list': []}})
+
+  def test_conditional_get_returns_304_until_data_changes(self):
+    london = make_location()
+    make_query(london, [10.0, 11.0])
+    url = reverse('weather:api-record-list')
+    first = self.client.get(url, {'location': london.pk})
+    self.assertEqual(first.status_code, 200)
+    self.assertEqual(len(first.json()['results']), 2)
+
+    again = self.client.get(url, {'location': london.pk}, HTTP_IF_NONE_MATCH=first['ETag'])
+    self.assertEqual(again.status_code, 304)
+    since = self.client.get(url, {'location': london.pk}, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+    self.assertEqual(since.status_code, 304)
+
+    rec = WeatherRecord.objects.filter(location=london).first()
+    rec.temp_c = 30.0
+    rec.save()
+    changed = self.client.get(url, {'location': london.pk}, HTTP_IF_NONE_MATCH=first['ETag'])
+    self.assertEqual(changed.status_code, 200)
+    self.assertNotEqual(changed['ETag'], first['ETag'])
+
+  def test_upsert_changes_the_query_etag(self):
+    london = make_location()
+    wq = make_query(london, [10.0])
+    url = reverse('weather:api-query-detail', args=[wq.pk])
+    etag = self.client.get(url, {'fields': 'id,records'})['ETag']
+    upsert_weather_records([WeatherRecord(location=london, date=date(2025, 1, 1), temp_c=12.0, source_query=wq)])
+    response = self.client.get(url, {'fields': 'id,records'}, HTTP_IF_NONE_MATCH=etag)
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.json()['records'][0]['temp_c'], 12.0)
+
+  def test_deleting_a_query_changes_its_records_etag(self):
+    london = make_location()
+    wq = make_query(london, [10.0])
+    url = reverse('weather:api-record-list')
+    etag = self.client.get(url, {'location': london.pk})['ETag']
+    self.client.post(reverse('weather:delete_query', args=[wq.pk]))
+    response = self.client.get(url, {'location': london.pk}, HTTP_IF_NONE_MATCH=etag)
+    self.assertEqual(response.status_code, 200)
+    self.assertIsNone(response.json()['results'][0]['source_query'])
+
+  def test_editing_a_location_changes_its_etag(self):
+    london = make_location()
+    make_query(london, [10.0])
+    for url in (reverse('weather:api-location-list'), reverse('weather:api-query-list')):
+      etag = self.client.get(url)['ETag']
+      london.display_name = f'London, {url}'
+      london.save()
+      response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+      self.assertEqual(response.status_code, 200, url)
+
+  def test_unknown_detail_is_404(self):
+    self.assertEqual(self.client.get(reverse('weather:api-query-detail', args=[999])).status_code, 404)
+
+
+class RefreshForecastsTests(TestCase):
+  def test_refreshes_most_queried_locations_without_detaching_records(self):
+    london = make_location('London')
+    paris = make_location('Paris', 48.85, 2.35, country='FR')
+    make_location('Unwatched', 10.0, 10.0)
+    tomorrow = date.today() + timedelta(days=1)
+    wq = make_query(london, [5.0], start=tomorrow)
+    make_query(london, [5.0], start=tomorrow - timedelta(days=30))
+    make_query(paris, [5.0], start=tomorrow - timedelta(days=60))
+
+    self.assertEqual([l.name for l in watched_locations(10, timedelta(hours=1))], ['London', 'Paris'])
+
+    with mock.patch('weather.management.commands.refresh_forecasts.fetch_openweather_forecast',
+                    return_value=make_forecast_json(temp=30.0)):
+      call_command('refresh_forecasts', '--once', '--rate', '1000', stdout=StringIO())
+
+    rec = WeatherRecord.objects.get(location=london, date=tomorrow)
+    self.assertNotEqual(rec.temp_c, 5.0)
+    self.assertEqual(rec.source_query, wq)
+    self.assertEqual(WeatherRecord.objects.filter(location=paris).count(), 4)
+    self.assertFalse(watched_locations(10, timedelta(hours=1)).exists())
+
+
+class RateLimiterTests(TestCase):
+  def test_acquire_waits_for_tokens(self):
+    limiter = RateLimiter(rate=20, burst=1)
+    started = time.monotonic()
+    for _ in range(3):
+      limiter.acquire()
+    self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+    slow = RateLimiter(rate=0.1)
+    self.assertTrue(slow.acquire())
+    self.assertFalse(slow.acquire(timeout=0))
+
+
+class RawPayloadTests(TestCase):
+  def test_payloads_are_compressed_and_deduplicated(self):
+    forecast = make_forecast_json()
+    first = RawPayload.store(forecast)
+    self.assertEqual(RawPayload.store(forecast), first)
+    self.assertEqual(RawPayload.store_many([forecast, {'list': []}])[0], first)
+    self.assertEqual(RawPayload.objects.count(), 2)
+    self.assertLess(len(bytes(first.data)), first.size)
+
+    wq = WeatherQuery.objects.create(location=make_location(), start_date=date(2025, 1, 1),
+                                     end_date=date(2025, 1, 1), raw_payload=first)
+    self.assertEqual(WeatherQuery.objects.get(pk=wq.pk).raw_response, forecast)
+
+  def test_prune_drops_expired_payloads_only(self):
+    loc = make_location()
+    old = WeatherQuery.objects.create(location=loc, start_date=date(2025, 1, 1), end_date=date(2025, 1, 1),
+                                      created_at=timezone.now() - timedelta(days=90), raw_payload=RawPayload.store({'old': 1}))
+    shared = RawPayload.store({'shared': 1})
+    WeatherQuery.objects.create(location=loc, start_date=date(2025, 1, 1), end_date=date(2025, 1, 1),
+                                created_at=timezone.now() - timedelta(days=90), raw_payload=shared)
+    recent = WeatherQuery.objects.create(location=loc, start_date=date(2025, 1, 1), end_date=date(2025, 1, 1), raw_payload=shared)
+
+    call_command('prune_raw_payloads', '--days', '30', stdout=StringIO())
+
+    self.assertIsNone(WeatherQuery.objects.get(pk=old.pk).raw_payload)
+    self.assertEqual(WeatherQuery.objects.get(pk=recent.pk).raw_payload, shared)
+    self.assertEqual(list(RawPayload.objects.all()), [shared])
+
+
+TESTDATA = Path(__file__).resolve().parent / 'testdata'
+
+
+def load_forecast(name):
+  with open(TESTDATA / name, encoding='utf-8') as f:
+    return json.load(f)
+
+
+class ForecastAggregationTests(TestCase):
+  recorded = ['forecast_nagornyy.json', 'forecast_la_chatre.json']
+
+  def test_recorded_forecasts(self):
+    days = [forecast_agg.aggregate_forecast(load_forecast(name), date(2025, 8, 19)) for name in self.recorded]
+    self.assertEqual([len(d) for d in days], [5, 5])
+    first = days[0][0]
+    self.assertEqual((first['date'], first['day_name']), ('2025-08-20', 'Wednesday'))
+    for day in days[0] + days[1]:
+      self.assertLessEqual(day['min_temp'], day['temperature'])
+      self.assertLessEqual(day['temperature'], day['max_temp'])
+
+  def test_matches_reference_grouping(self):
+    # the reference buckets by server date; pin the city to UTC so both agree (TIME_ZONE is UTC)
+    for name in self.recorded:
+      forecast = load_forecast(name)
+      forecast['city']['timezone'] = 0
+      for today in (date(2025, 8, 19), date(2025, 8, 21), date(2025, 9, 1)):
+        with self.subTest(name=name, today=today):
+          self.assertEqual(forecast_agg.aggregate_forecast(forecast, today),
+                           forecast_agg.reference_forecast(forecast, today))
+
+  def test_description_ties_go_to_first_seen(self):
+    forecast = make_forecast_json(days=2)
+    for i, slot in enumerate(forecast['list']):
+      slot['weather'][0]['description'] = 'rain' if i % 2 else 'snow'
+    self.assertEqual(forecast_agg.aggregate_forecast(forecast, date.today())[0]['description'], 'snow')
+
+  def test_empty_forecasts(self):
+    self.assertEqual(forecast_agg.aggregate_forecast({'list': []}, date.today()), [])
+    self.assertEqual(forecast_agg.aggregate_forecast({}, date.today()), [])
+
+  def test_slots_are_bucketed_by_city_local_date(self):
+    # 2025-08-19 22:00 UTC is already the 20th in Nagornyy (UTC+3)
+    slot = load_forecast('forecast_nagornyy.json')['list'][0]
+    forecast = {'list': [dict(slot, dt=int(datetime(2025, 8, 19, 22, tzinfo=dt_timezone.utc).timestamp()))],
+                'city': {'timezone': 10800}}
+    today = date(2025, 8, 1)
+    self.assertEqual(forecast_agg.aggregate_forecast(forecast, today)[0]['date'], '2025-08-20')
+    forecast['city']['timezone'] = -14400
+    self.assertEqual(forecast_agg.aggregate_forecast(forecast, today)[0]['date'], '2025-08-19')
+
+  def test_today_defaults_to_each_citys_local_date(self):
+    forecasts = [make_forecast_json(days=2, tz=tz) for tz in (-36000, 0, 50400)]
+    for forecast in forecasts:
+      # a slot at local noon today must be skipped
+      first = forecast['list'][0]
+      forecast['list'].insert(0, dict(first, dt=first['dt'] - 12 * 3600))
+    for forecast in forecasts:
+      days = forecast_agg.aggregate_forecast(forecast)
+      self.assertEqual(len(days), 2)
+      city_today = (timezone.now() + timedelta(seconds=forecast['city']['timezone'])).date()
+      self.assertEqual(days[0]['date'], (city_today + timedelta(days=1)).isoformat())
@@ -1,5 +1,6 @@
 from django.urls  import path
-from . import views
+from rest_framework.routers import SimpleRouter
+from . import api, views
 
 app_name = "weather"
 
@@ -7,6 +8,15 @@ urlpatterns = [
   path('', views.home, name='home'),
   path('api/get_weather/', views.get_weather, name='get_weather'),
   path("queries/create/", views.create_query, name="create_query"),
+  path("api/queries/batch/", views.create_queries_batch, name="create_queries_batch"),
+  path("api/records/export/", views.export_records, name="export_records"),
   path("records/<int:pk>/update/", views.update_record, name="update_record"),
   path("queries/<int:pk>/delete/", views.delete_query, name="delete_query")
 ]
+
+# Read-only JSON API (after the routes above, so api/queries/batch/ wins over a detail lookup)
+router = SimpleRouter()
+router.register("api/locations", api.LocationViewSet, basename="api-location")
+router.register("api/queries", api.WeatherQueryViewSet, basename="api-query")
+router.register("api/records", api.WeatherRecordViewSet, basename="api-record")
+urlpatterns += router.urls
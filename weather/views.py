@@ -1,52 +1,103 @@
 from django.views.decorators.csrf import csrf_protect, ensure_csrf_cookie
 from django.views.decorators.http import require_http_methods
+from django.core.paginator import Paginator
+from django.db.models import Count, Prefetch
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from .cache_utils import cached_home_count, cached_home_page, home_cache_ttl
 
 """ Main Page """
-COMFORT_TEMP = 20.0 # °C target for "most temperate" day
 MAX_DAYS = 5
+NEAREST_LOCATION_RADIUS_KM = 0.5 # reuse a stored Location this close to GPS/landmark input
+HOME_PAGE_SIZE = 20 # saved queries shown per page
+CSRF_SENTINEL = 'csrf-token-placeholder' # rendered instead of the real token so cached HTML is shareable
 
-def build_home_context():
-  """Return the same context that the home view and error-rendering branches expect."""
-  queries = WeatherQuery.objects.select_related('location').order_by('-created_at')
+def build_home_context(page=1):
+  """Return the same context that the home view and error-rendering branches expect.
+
+  Only one page of queries is loaded, and their records come from a single
+  prefetch, so the number of SQL statements does not grow with the table.
+  The best day is the one stored on each query (services.refresh_best_days).
+  """
+  queries = (
+    WeatherQuery.objects
+    .select_related('location')
+    .prefetch_related(Prefetch(
+      'weatherrecord_set',
+      queryset=WeatherRecord.objects.order_by('date'),
+      to_attr='ordered_records'
+    ))
+    .order_by('-created_at', '-pk')
+  )
+  page_obj = Paginator(queries, HOME_PAGE_SIZE).get_page(page)
 
   queries_with_best = []
-  for q in queries:
-    records = list(WeatherRecord.objects.filter(source_query=q).order_by('date'))
-    best_day = None
-    best_temp = None
-    if records:
-      valid_records = [r for r in records if r.temp_c is not None]
-      if valid_records:
-        best_rec = min(valid_records, key=lambda r: abs((r.temp_c or 0) - COMFORT_TEMP))
-        best_day = best_rec.date
-        best_temp = best_rec.temp_c
+  for q in page_obj:
+    records = q.ordered_records
     queries_with_best.append({
       'query': q,
-      'best_day': best_day,
-      'best_temp': best_temp,
+      'best_day': q.best_day,
+      'best_temp': q.best_temp,
       'records': records,
+      # changes whenever anything shown in this query's fragment does
+      'fragment_key': (
+        q.pk, q.updated_at.isoformat(), q.location.display_name, len(records),
+        max((r.updated_at for r in records), default=q.updated_at).isoformat()
+      ),
     })
-  return {'queries_with_best': queries_with_best}
+  return {'queries_with_best': queries_with_best, 'page_obj': page_obj}
+
+def render_home_html(request, context):
+  """
+  Render home.html with a placeholder CSRF token, so the HTML (and the per-query
+  fragments cached while rendering it) is the same for every visitor.
+  """
+  context = {**context, 'csrf_token': CSRF_SENTINEL, 'fragment_ttl': home_cache_ttl()}
+  return render_to_string('weather/home.html', context, request)
+
+def home_response(request, html):
+  return HttpResponse(html.replace(CSRF_SENTINEL, get_token(request)))
+
+def render_home(request, context):
+  return home_response(request, render_home_html(request, context))
+
+def home_page_number(value):
+  """
+  The page Paginator.get_page(value) shows (out-of-range and junk values
+  clamp), so each real page has one cache entry. The count is cached too.
+  """
+  count = cached_home_count(lambda: WeatherQuery.objects.count())
+  return Paginator(range(count), HOME_PAGE_SIZE).get_page(value).number
 
 @ensure_csrf_cookie
 @require_http_methods(["GET"])
 def home(request):
-    context = build_home_context()
-    return render(request, 'weather/home.html', context)
+    # served from cache until a write to the queries or records (weather.signals)
+    page = home_page_number(request.GET.get('page'))
+    html = cached_home_page(page, lambda: render_home_html(request, build_home_context(page)))
+    return home_response(request, html)
 """ --------- """
 
 
 
 """ Weather Processing / API fetching - Logic """
-import re
 import json
+import time
 import requests
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from django.conf import settings
 from django.shortcuts import render
 from django.http import JsonResponse
 from .ml_utils import classify_address_type
-from datetime import datetime
-from collections import Counter
+from .address_rules import parse_gps_coordinates
+from . import http_client
+from .fetch_weather import submit_openweather
+from .geocoder import geocode
+from .fuzzy_index import normalize
+from .spatial_index import nearest_location
+from .singleflight import single_flight
+from .forecast_agg import aggregate_forecast
 
 
 @csrf_protect
@@ -70,7 +121,14 @@ def get_weather(request):
     
   
   # Using The AI Model To Classify
-  address_type = classify_address_type(location)
+  try:
+    address_type = classify_address_type(location)
+  except Exception as e:  # batch timed out or the model failed
+    print(e)
+    return JsonResponse({
+      'success': False,
+      'error': 'Address classifier unavailable, please try again.'
+    }, status=503)
 
   # Fetching From API
   try:
@@ -91,11 +149,10 @@ def get_weather(request):
       'error': weather_data.get('error', 'Unknown error occurred')
     })
   
+@single_flight(lambda location, address_type: ('weather', ' '.join(location.lower().split()), address_type))
 def process_weather_request(location: str, address_type: str):
   try:
     API_KEY = settings.API_KEY
-    weather_url = "http://api.openweathermap.org/data/2.5/weather"
-    forecast_url = "http://api.openweathermap.org/data/2.5/forecast"
     
     # Prepare parameters based on address type
     if address_type == 'Zip Code':
@@ -109,6 +166,10 @@ def process_weather_request(location: str, address_type: str):
       # Parse GPS coordinates (lat,lon format)
       coords = parse_gps_coordinates(location)
       if coords:
+        # Reuse a stored Location a few hundred metres away, so its cached weather is hit
+        known = nearest_location(coords['lat'], coords['lon'], NEAREST_LOCATION_RADIUS_KM)
+        if known:
+          coords = {'lat': known.latitude, 'lon': known.longitude}
         params = {
           'lat': coords['lat'],
           'lon': coords['lon'],
@@ -117,14 +178,26 @@ def process_weather_request(location: str, address_type: str):
         }
 
     elif address_type == 'Landmarks':
-      geo = geocode_landmark_nominatim(location)
-      if not geo:
-        return {"success": False, "error": "Could not resolve landmark"}
-      params = {
-        'q': geo['city'],
-        'appid': API_KEY,
-        'units': 'metric'
-      }
+      # A landmark already geocoded by create_query needs no Nominatim call
+      known = Location.objects.filter(name_key=normalize(location)).first()
+      if not known:
+        geo = geocode_landmark_nominatim(location)
+        if not geo:
+          return {"success": False, "error": "Could not resolve landmark"}
+        known = nearest_location(geo['lat'], geo['lon'], NEAREST_LOCATION_RADIUS_KM)
+      if known:
+        params = {
+          'lat': known.latitude,
+          'lon': known.longitude,
+          'appid': API_KEY,
+          'units': 'metric'
+        }
+      else:
+        params = {
+          'q': geo['city'],
+          'appid': API_KEY,
+          'units': 'metric'
+        }
 
     else:
       params = {
@@ -133,19 +206,34 @@ def process_weather_request(location: str, address_type: str):
         'units': 'metric'
       }
     
-    # Weather API request
-    current_response = requests.get(weather_url, params=params)
-    
-    if current_response.status_code != 200:
+    # Current weather and forecast are fetched concurrently (and served from
+    # the response cache when possible), so we wait for the slower of the two
+    timeout = http_client.provider_timeout('openweather')
+    deadline = time.monotonic() + timeout
+    current_future = submit_openweather('current', params)
+    forecast_future = submit_openweather('forecast', params)
+
+    try:
+      current_data = current_future.result(timeout=timeout)
+    except requests.HTTPError as e:
+      forecast_future.cancel()
       return {
         'success': False,
-        'error': f'Weather API error: {current_response.status_code}'
+        'error': f'Weather API error: {e.response.status_code}'
       }
-    
-    current_data = current_response.json()
-    
-    # Forecast API request
-    forecast_response = requests.get(forecast_url, params=params)
+    except FuturesTimeoutError:
+      current_future.cancel()
+      forecast_future.cancel()
+      return {
+        'success': False,
+        'error': 'Weather API timed out'
+      }
+
+    try:
+      forecast_json = forecast_future.result(timeout=max(0, deadline - time.monotonic()))
+    except (requests.HTTPError, FuturesTimeoutError):
+      forecast_future.cancel()
+      forecast_json = None
     
     # Process current weather
     weather_info = {
@@ -169,8 +257,7 @@ def process_weather_request(location: str, address_type: str):
     
     # Process forecast data
     forecast_data = []
-    if forecast_response.status_code == 200:
-      forecast_json = forecast_response.json()
+    if forecast_json is not None:
       forecast_data = process_forecast_data(forecast_json)
     
     return {
@@ -196,140 +283,20 @@ def process_weather_request(location: str, address_type: str):
     }
 
 def process_forecast_data(forecast_json):
-  daily = {}  # keyed by 'YYYY-MM-DD'
-  today = datetime.now().date()
-
-  for item in forecast_json.get('list', []):
-    dt = datetime.fromtimestamp(item['dt'])
-    date_obj = dt.date()
-    if date_obj == today:
-      continue  # skip today
-
-    date_key = date_obj.isoformat()
-
-    if date_key not in daily:
-      daily[date_key] = {
-        'day_name': dt.strftime('%A'),
-        'temp_sum': 0.0,
-        'temp_count': 0,
-        'temp_max': float('-inf'),
-        'temp_min': float('inf'),
-        'humidity_sum': 0.0,
-        'wind_sum_kmh': 0.0,
-        'feels_sum': 0.0,
-        'rain_sum': 0.0,
-        'visibility': item.get('visibility', 0) / 1000,
-        'count': 0,
-        'desc_counter': Counter(),
-        'icon_counter': Counter()
-      }
-
-    d = daily[date_key]
-
-    temp = item['main']['temp']
-    d['temp_sum'] += temp
-    d['temp_count'] += 1
-    d['temp_max'] = max(d['temp_max'], temp)
-    d['temp_min'] = min(d['temp_min'], temp)
-
-    humidity = item['main'].get('humidity', 0)
-    d['humidity_sum'] += humidity
-
-    wind_ms = item.get('wind', {}).get('speed', 0.0)
-    d['wind_sum_kmh'] += (wind_ms * 3.6)
-
-    feels = item['main'].get('feels_like', temp)
-    d['feels_sum'] += feels
-
-    # 'pop' is probability of precipitation (0..1) in forecast API
-    rain_prob = item.get('pop', 0) * 100
-    d['rain_sum'] += rain_prob
-
-    d['count'] += 1
-
-    desc = item['weather'][0].get('description', '')
-    icon = item['weather'][0].get('icon', '')
-    d['desc_counter'][desc] += 1
-    d['icon_counter'][icon] += 1
-
-  processed_forecasts = []
-  for date_key in sorted(daily.keys()):
-    d = daily[date_key]
-
-    avg_temp = round(d['temp_sum'] / d['temp_count'], 1)
-    max_temp = round(d['temp_max'], 1)
-    min_temp = round(d['temp_min'], 1)
-    avg_humidity = round(d['humidity_sum'] / d['temp_count'])
-    avg_wind = round(d['wind_sum_kmh'] / d['temp_count'], 1)
-    avg_feels_like = round(d['feels_sum'] / d['temp_count'], 1)
-    avg_rain_chance = round(d['rain_sum'] / d['temp_count'])
-
-    most_common_desc = d['desc_counter'].most_common(1)[0][0] if d['desc_counter'] else ''
-    most_common_icon = d['icon_counter'].most_common(1)[0][0] if d['icon_counter'] else ''
-
-    processed_forecasts.append({
-      'date': date_key,
-      'day_name': d['day_name'],
-      'temperature': avg_temp,
-      'max_temp': max_temp,
-      'min_temp': min_temp,
-      'feels_like': avg_feels_like,
-      'description': most_common_desc,
-      'icon': most_common_icon,
-      'humidity': avg_humidity,
-      'wind_speed': avg_wind,
-      'rain_chance': avg_rain_chance,
-      'visibility': d['visibility'],
-      'warnings': None
-    })
-
-    processed_forecasts[-1]['warnings'] = warnings_check(processed_forecasts[-1], d['day_name'])
-
+  processed_forecasts = aggregate_forecast(forecast_json)
+  for day in processed_forecasts:
+    day['warnings'] = warnings_check(day, day['day_name'])
   return processed_forecasts
 
-def parse_gps_coordinates(location):
-  try:
-    coords = re.split(r'[,\s]+', location.strip())
-    
-    if len(coords) == 2:
-      lat = float(coords[0])
-      lon = float(coords[1])
-      
-      # Validate coordinate ranges
-      if -90 <= lat <= 90 and -180 <= lon <= 180:
-        return {'lat': lat, 'lon': lon}
-  
-    return None
-
-  except (ValueError, IndexError):
-    return None
-
 def geocode_landmark_nominatim(landmark):
   """
   Convert a landmark name to coordinates (lat, lon) and city.
+  Goes through the persistent geocode cache (see geocoder.py).
   """
-  url = "https://nominatim.openstreetmap.org/search"
-  params = {
-    "q": landmark,
-    "format": "json",
-    "limit": 1,
-    "addressdetails": 1
-  }
-  headers = {
-    "User-Agent": "WeatherAPP/1.0"  # Nominatim requires a User-Agent
-  }
-  response = requests.get(url, params=params, headers=headers)
-  if response.status_code == 200 and response.json():
-    data = response.json()[0]
-    lat = float(data["lat"])
-    lon = float(data["lon"])
-
-    # Try to get city from address components
-    address = data.get("address", {})
-    city = address.get("city") or address.get("town") or address.get("village") or address.get("state")
-    
-    return {"lat": lat, "lon": lon, "city": city or data.get("display_name")}
-  
+  place = geocode(landmark)
+  if place:
+    return {"lat": place['lat'], "lon": place['lon'], "city": place['city'] or place['display_name']}
+
   return None
 
 def warnings_check(data, day):
@@ -360,82 +327,138 @@ def warnings_check(data, day):
 
 """ Database Processing CRUD - Libraries """
 from django.shortcuts import redirect, get_object_or_404
+from django.utils import timezone
 from django.utils.dateparse import parse_date
-from django.db import transaction
-from datetime import date
-from .models import Location, WeatherQuery, WeatherRecord
+from django.db import connection, transaction
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .models import Location, RawPayload, WeatherQuery, WeatherRecord
 from .geocode import get_or_create_location
-from .fetch_weather import fetch_openweather_forecast, fetch_weather_for_range, parse_api_daily
+from .fetch_weather import fetch_openweather_forecast, fetch_daily_history
+from .services import forecast_day_records, missing_date_ranges, refresh_best_days, upsert_weather_records
+from .signals import invalidate_home
 
-# Celsius to Fahrenheit
-def c_to_f(c):
-  if c is None:
-    return None
-  return round(c * 9.0 / 5.0 + 32.0, 1)
+# Past days come from Open-Meteo's archive; MAX_DAYS only limits the forecast part
+MAX_HISTORY_DAYS = 3660
+HISTORY_START = date(1940, 1, 1) # first day in the Open-Meteo archive
 
-# -- CREATE
-@require_http_methods(["POST"])
-def create_query(request):
-    # Get inputs
-    loc_text = request.POST.get('location', '').strip()
-    start_date = parse_date(request.POST.get('start_date'))
-    end_date = parse_date(request.POST.get('end_date'))
+class QueryError(Exception):
+    """A create-query step failed; the message is shown to the user."""
 
-    # Basic validation BEFORE any DB operation
+def validate_query_input(loc_text, start_date, end_date):
+    """Return the error message for invalid create-query input, or None."""
     if not loc_text:
-        ctx = build_home_context()
-        ctx['error'] = 'Location is required.'
-        return render(request, 'weather/home.html', ctx)
+        return 'Location is required.'
 
     if not (start_date and end_date):
-        ctx = build_home_context()
-        ctx['error'] = 'Invalid dates.'
-        return render(request, 'weather/home.html', ctx)
+        return 'Invalid dates.'
 
     if start_date > end_date:
-        ctx = build_home_context()
-        ctx['error'] = 'Start date must be <= End date.'
-        return render(request, 'weather/home.html', ctx)
+        return 'Start date must be <= End date.'
 
     # Enforce max period length BEFORE any network or DB write
-    if (end_date - start_date).days + 1 > MAX_DAYS:
-        ctx = build_home_context()
-        ctx['error'] = f'Maximum allowed period is {MAX_DAYS} days.'
-        return render(request, 'weather/home.html', ctx)
+    today = date.today()
+    if (end_date - max(start_date, today)).days + 1 > MAX_DAYS:
+        return f'Maximum allowed period is {MAX_DAYS} days.'
+
+    if (end_date - start_date).days + 1 > MAX_HISTORY_DAYS:
+        return f'Maximum allowed period is {MAX_HISTORY_DAYS} days.'
 
+    if start_date < HISTORY_START:
+        return f'Historical data starts at {HISTORY_START.isoformat()}.'
+
+    return None
+
+def history_range(start_date, end_date):
+    """The past part (before today) of a query's date range, or None."""
+    yesterday = date.today() - timedelta(days=1)
+    if start_date > yesterday:
+        return None
+    return start_date, min(end_date, yesterday)
+
+def claim_history_records(location, start_date, end_date, wq):
+    """Point the stored past days of a query's range at it, as the upsert does for new rows."""
+    past = history_range(start_date, end_date)
+    if not past:
+        return
+    records = WeatherRecord.objects.filter(location=location, date__range=past)
+    previous_owners = set(records.exclude(source_query=wq).values_list('source_query_id', flat=True).distinct())
+    if records.update(source_query=wq, updated_at=timezone.now()):
+        refresh_best_days(previous_owners | {wq.pk})
+        invalidate_home()  # QuerySet.update() sends no signals
+
+def fetch_query_days(loc_text, start_date, end_date):
+    """
+    Resolve the location and fetch the days of the date range it doesn't have yet
+    (no DB writes except caching a newly geocoded Location): past days missing
+    from stored history come from Open-Meteo, future days from the forecast.
+    Returns (location, forecast_json or None, selected_days); raises QueryError.
+    """
     # Resolve location (may call external service) - OK to do after validation
     try:
         location = get_or_create_location(loc_text)
     except Exception as e:
-        ctx = build_home_context()
-        ctx['error'] = f'Location error: {e}'
-        return render(request, 'weather/home.html', ctx)
+        raise QueryError(f'Location error: {e}')
+
+    selected_days = []
+    past = history_range(start_date, end_date)
+    if past:
+        try:
+            gaps = missing_date_ranges(location, *past)
+            history = fetch_daily_history(location.latitude, location.longitude, gaps) if gaps else []
+        except Exception as e:
+            raise QueryError(f'History API error: {e}')
+        selected_days += [
+            {'date': d['date'], 'temperature': d['temp_c'], 'description': d['description'], 'observed': d['observed']}
+            for d in history
+        ]
+
+    if end_date < date.today():
+        return location, None, selected_days
 
     # Get forecast JSON (external API) - still before DB writes
     try:
         forecast_json = fetch_openweather_forecast(location.latitude, location.longitude)
     except Exception as e:
-        ctx = build_home_context()
-        ctx['error'] = f'Forecast API error: {e}'
-        return render(request, 'weather/home.html', ctx)
+        raise QueryError(f'Forecast API error: {e}')
 
     # Process forecast to daily summaries (your provided function)
     try:
         processed = process_forecast_data(forecast_json)
     except Exception as e:
-        ctx = build_home_context()
-        ctx['error'] = f'Failed to process forecast: {e}'
-        return render(request, 'weather/home.html', ctx)
+        raise QueryError(f'Failed to process forecast: {e}')
 
     # Filter processed days to user-specified range
     start_s = start_date.isoformat()
     end_s = end_date.isoformat()
-    selected_days = [d for d in processed if start_s <= d['date'] <= end_s]
+    selected_days += [d for d in processed if start_s <= d['date'] <= end_s]
+
+    if not selected_days and not past:
+        raise QueryError('No forecast data available for that date range.')
 
-    if not selected_days:
+    return location, forecast_json, selected_days
+
+# -- CREATE
+@require_http_methods(["POST"])
+def create_query(request):
+    # Get inputs
+    loc_text = request.POST.get('location', '').strip()
+    start_date = parse_date(request.POST.get('start_date'))
+    end_date = parse_date(request.POST.get('end_date'))
+
+    # Basic validation BEFORE any DB operation
+    error = validate_query_input(loc_text, start_date, end_date)
+    if error:
         ctx = build_home_context()
-        ctx['error'] = 'No forecast data available for that date range.'
-        return render(request, 'weather/home.html', ctx)
+        ctx['error'] = error
+        return render_home(request, ctx)
+
+    try:
+        location, forecast_json, selected_days = fetch_query_days(loc_text, start_date, end_date)
+    except QueryError as e:
+        ctx = build_home_context()
+        ctx['error'] = str(e)
+        return render_home(request, ctx)
 
     # All validations passed and data available -> perform DB writes within a transaction
     try:
@@ -445,35 +468,122 @@ def create_query(request):
                 start_date=start_date,
                 end_date=end_date,
                 requester=request.user.username if request.user.is_authenticated else '',
-                raw_response=forecast_json
+                raw_payload=RawPayload.store(forecast_json) if forecast_json else None
             )
 
-            for day in selected_days:
-                # convert 'YYYY-MM-DD' to date object (safe)
-                try:
-                    date_obj = date.fromisoformat(day['date'])
-                except Exception:
-                    date_obj = day['date']
-
-                WeatherRecord.objects.update_or_create(
-                    location=location,
-                    date=date_obj,
-                    defaults={
-                        'temp_c': day.get('temperature'),
-                        'temp_f': c_to_f(day.get('temperature')) if day.get('temperature') is not None else None,
-                        'description': day.get('description', ''),
-                        'source_query': wq
-                    }
-                )
+            upsert_weather_records(forecast_day_records(location, selected_days, source_query=wq))
+            claim_history_records(location, start_date, end_date, wq)
     except Exception as e:
         # Any DB/external error: do NOT delete existing DB objects; just show an error
         ctx = build_home_context()
         ctx['error'] = f'Failed saving query: {e}'
-        return render(request, 'weather/home.html', ctx)
+        return render_home(request, ctx)
 
     # Success -> redirect to home (which will show new query)
     return redirect('weather:home')
 
+# -- CREATE (batch)
+BATCH_MAX_ITEMS = 500
+BATCH_MAX_WORKERS = 8 # concurrent geocode + forecast fetches per batch
+
+def _parse_batch_date(value):
+    try:
+        return parse_date(str(value or ''))
+    except ValueError:
+        return None
+
+def _fetch_batch_item(loc_text, start_date, end_date):
+    try:
+        return fetch_query_days(loc_text, start_date, end_date)
+    finally:
+        # pool threads open their own DB connection when geocoding
+        connection.close()
+
+@csrf_protect
+@require_http_methods(["POST"])
+def create_queries_batch(request):
+    """
+    JSON body: {"items": [{"location": ..., "start_date": "YYYY-MM-DD", "end_date": ...}, ...]}
+    Items are geocoded and fetched concurrently, then all queries and records are
+    written in bulk. Returns one result per item, in order.
+    """
+    try:
+        items = json.loads(request.body).get('items')
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Invalid Json Data!'}, status=400)
+
+    if not isinstance(items, list) or not items:
+        return JsonResponse({'success': False, 'error': 'items must be a non-empty list.'}, status=400)
+    if len(items) > BATCH_MAX_ITEMS:
+        return JsonResponse({'success': False, 'error': f'At most {BATCH_MAX_ITEMS} items per batch.'}, status=400)
+
+    results = [None] * len(items)
+    pending = {}  # index -> (loc_text, start_date, end_date)
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[i] = {'success': False, 'error': 'Item must be an object.'}
+            continue
+        loc_text = str(item.get('location') or '').strip()
+        start_date = _parse_batch_date(item.get('start_date'))
+        end_date = _parse_batch_date(item.get('end_date'))
+        error = validate_query_input(loc_text, start_date, end_date)
+        if error:
+            results[i] = {'success': False, 'error': error}
+        else:
+            pending[i] = (loc_text, start_date, end_date)
+
+    fetched = {}  # index -> (location, forecast_json, selected_days)
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(BATCH_MAX_WORKERS, len(pending))) as pool:
+            futures = {pool.submit(_fetch_batch_item, *args): i for i, args in pending.items()}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    fetched[i] = future.result()
+                except QueryError as e:
+                    results[i] = {'success': False, 'error': str(e)}
+
+    order = sorted(fetched)
+    requester = request.user.username if request.user.is_authenticated else ''
+    try:
+        with transaction.atomic():
+            # history-only items have no forecast payload to keep
+            stored = iter(RawPayload.store_many([fetched[i][1] for i in order if fetched[i][1]]))
+            payloads = [next(stored) if fetched[i][1] else None for i in order]
+            queries = WeatherQuery.objects.bulk_create([
+                WeatherQuery(
+                    location=fetched[i][0],
+                    start_date=pending[i][1],
+                    end_date=pending[i][2],
+                    requester=requester,
+                    raw_payload=payload
+                )
+                for i, payload in zip(order, payloads)
+            ])
+            invalidate_home()
+
+            # later items win when several cover the same (location, date)
+            records = {}
+            for i, wq in zip(order, queries):
+                location, _, selected_days = fetched[i]
+                for rec in forecast_day_records(location, selected_days, source_query=wq):
+                    records[(location.pk, rec.date)] = rec
+            upsert_weather_records(list(records.values()))
+            for i, wq in zip(order, queries):
+                claim_history_records(fetched[i][0], pending[i][1], pending[i][2], wq)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': f'Failed saving queries: {e}'}, status=500)
+
+    # overlapping items leave earlier queries fewer records than they fetched
+    days = dict(
+        WeatherRecord.objects.filter(source_query__in=queries)
+        .values('source_query').annotate(n=Count('pk')).values_list('source_query', 'n')
+    )
+    for i, wq in zip(order, queries):
+        results[i] = {'success': True, 'query_id': wq.pk, 'days': days.get(wq.pk, 0)}
+
+    return JsonResponse({'success': True, 'results': results})
+
 # -- UPDATE
 @require_http_methods(["POST"])
 def update_record(request, pk):
@@ -520,4 +630,70 @@ def query_detail(request, pk):
   records = WeatherRecord.objects.filter(source_query=q).order_by('date')
   return render(request, 'weather/home.html', {'query': q, 'records': records})
 
-""" ------------------------------------ """
\ No newline at end of file
+""" ------------------------------------ """
+
+
+""" Export """
+import csv
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+# same columns as serializers.WeatherRecordSerializer (fields = '__all__', foreign keys as ids)
+EXPORT_FIELDS = tuple(f.name for f in WeatherRecord._meta.concrete_fields)
+EXPORT_CHUNK_ROWS = 2000 # rows fetched per cursor round-trip and written per response chunk
+EXPORT_CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+class _Echo:
+  """csv.writer target that hands each formatted line back instead of buffering it."""
+  def write(self, value):
+    return value
+
+def export_rows(queryset, fmt):
+  """Yield the export body in chunks, reading rows off a cursor EXPORT_CHUNK_ROWS at a time."""
+  rows = queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_ROWS)
+  if fmt == 'csv':
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    format_row = writer.writerow
+  else:
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    format_row = lambda row: encoder.encode(dict(zip(EXPORT_FIELDS, row))) + '\n'
+
+  chunk = []
+  for row in rows:
+    chunk.append(format_row(row))
+    if len(chunk) >= EXPORT_CHUNK_ROWS:
+      yield ''.join(chunk)
+      chunk = []
+  if chunk:
+    yield ''.join(chunk)
+
+@require_http_methods(["GET"])
+def export_records(request):
+  """
+  Stream WeatherRecords as CSV (default) or NDJSON (?format=ndjson).
+  Filters: ?location=<id or name>&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD
+  """
+  fmt = request.GET.get('format', 'csv')
+  if fmt not in EXPORT_CONTENT_TYPES:
+    return JsonResponse({'success': False, 'error': 'format must be csv or ndjson.'}, status=400)
+
+  records = WeatherRecord.objects.order_by('location_id', 'date')
+  loc = request.GET.get('location', '').strip()
+  if loc:
+    records = records.filter(location_id=int(loc)) if loc.isdigit() else records.filter(location__name__iexact=loc)
+  for param, lookup in (('start_date', 'date__gte'), ('end_date', 'date__lte')):
+    if request.GET.get(param):
+      try:
+        value = parse_date(request.GET[param])
+      except ValueError:
+        value = None
+      if value is None:
+        return JsonResponse({'success': False, 'error': f'Invalid {param}.'}, status=400)
+      records = records.filter(**{lookup: value})
+
+  response = StreamingHttpResponse(export_rows(records, fmt), content_type=EXPORT_CONTENT_TYPES[fmt])
+  response['Content-Disposition'] = f'attachment; filename="weather_records.{fmt}"'
+  return response
+
+""" ------ """
\ No newline at end of file
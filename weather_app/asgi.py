@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weather_app.settings')
 
 application = get_asgi_application()
+
+# Optionally load the address classifier in the background now rather than on
+# the first request (settings.ADDRESS_CLASSIFIER_WARMUP)
+from weather.ml_utils import start_warm_up  # noqa: E402
+
+start_warm_up()
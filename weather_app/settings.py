@@ -24,6 +24,51 @@ SECRET_KEY = 'django-insecure-_d%-32e+fn@09(1013c!#x*$$x^9(ac&!w^l06wv#5ws_%puqa
 
 API_KEY = 'c3b591a24fe3a2f0b6c22e791a71de8c'
 
+# OpenWeatherMap response cache: Django cache alias (None = in-process LRU only),
+# freshness per response kind and how long a stale entry may be served while it refreshes (seconds)
+WEATHER_CACHE_ALIAS = 'default'
+WEATHER_CACHE_TTL = {'current': 600, 'forecast': 1800}
+WEATHER_CACHE_STALE_TTL = 300
+
+# Rendered home pages and per-query fragments (seconds); writes invalidate them
+# sooner through weather.signals
+HOME_CACHE_TTL = 300
+
+# Outbound HTTP per provider ('openweather', 'open_meteo', 'nominatim'); any of
+# pool_size, timeout, retries, backoff overrides weather.http_client.DEFAULT_PROVIDERS
+UPSTREAM_HTTP = {}
+
+# Geocoding (weather.geocoder): Nominatim requests per second from this process,
+# how long a caller may queue for one, and how long found / not-found answers
+# stay in the GeocodeResult table (seconds)
+NOMINATIM_RATE = 1.0
+GEOCODER_QUEUE_TIMEOUT = 30
+GEOCODE_CACHE_TTL = 30 * 24 * 3600
+GEOCODE_NEGATIVE_TTL = 24 * 3600
+# Offline geocoding: SQLite gazetteer built by `manage.py build_gazetteer` from the
+# GeoNames dumps (e.g. BASE_DIR / 'gazetteer.sqlite3'). None = Nominatim only
+GAZETTEER_PATH = None
+
+# Concurrent identical upstream fetches are coalesced per process; set this to a
+# cache alias shared by all workers (e.g. Redis/Memcached) to also lock across processes
+SINGLE_FLIGHT_CACHE_ALIAS = None
+
+# Load the address classifier when the WSGI/ASGI server starts instead of on the
+# first classification request
+ADDRESS_CLASSIFIER_WARMUP = False
+
+# Address classifier inference backend: 'torch' (fp32), 'quantized' (int8) or
+# 'onnx' (ONNX Runtime); the last two need `manage.py export_classifier` first and
+# are loaded from ADDRESS_CLASSIFIER_ARTIFACT_DIR (None: the model directory)
+ADDRESS_CLASSIFIER_PATH = BASE_DIR / 'weather' / 'models' / 'address_classifier'
+ADDRESS_CLASSIFIER_BACKEND = 'torch'
+ADDRESS_CLASSIFIER_ARTIFACT_DIR = None
+
+# Memoized classifier predictions: per-process LRU size, and an optional Django
+# cache alias to share them across workers
+ADDRESS_CLASSIFIER_CACHE_SIZE = 4096
+ADDRESS_CLASSIFIER_CACHE_ALIAS = None
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
@@ -39,6 +84,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
     'weather'
 ]
 